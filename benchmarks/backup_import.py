@@ -0,0 +1,130 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+
+import fake_mealie
+import run_benchmarks
+import synthetic_library
+
+
+# BACKUP IMPORT ==========================================================================
+# Writes the synthetic library as a Mealie backup zip, the way Mealie stores it: one
+# database.json of table rows, with explicit nulls where the API would send "", and the
+# images under data/recipes/{id}/images/. Then builds a book and runs lint from it with
+# --fromBackup, and checks that both finish, that every recipe in the chosen categories
+# made it into the book, and that no page printed "None" for a missing text field.
+BACKUP_TABLES = ["recipes", "recipes_ingredients", "recipe_instructions", "notes", "categories", "tags",
+                 "recipes_to_categories", "recipes_to_tags", "ingredient_foods", "ingredient_units"]
+BACKUP_IMAGE_NAMES = ["original.webp", "min-original.webp", "tiny-original.webp"]
+
+def emptyToNull(value):
+    return value if value != "" else None
+
+def buildBackupTables(library):
+    tables = {tableName: [] for tableName in BACKUP_TABLES}
+    rowIds = {}
+
+    # Organizers, foods and units are rows of their own, shared by every recipe using them
+    def getRowId(tableName, key, row):
+        if (tableName, key) not in rowIds:
+            rowIds[(tableName, key)] = "{:032x}".format(len(rowIds) + 1)
+            tables[tableName].append(dict(row, id=rowIds[(tableName, key)]))
+        return rowIds[(tableName, key)]
+
+    for recipe in library:
+        recipeId = recipe["id"].replace("-", "")
+        tables["recipes"].append({"id": recipeId, "slug": recipe["slug"], "name": recipe["name"],
+                                  "description": emptyToNull(recipe["description"]), "image": recipe["image"],
+                                  "total_time": recipe["totalTime"], "prep_time": recipe["prepTime"],
+                                  "perform_time": recipe["performTime"], "updated_at": recipe["updatedAt"]})
+        for category in recipe["recipeCategory"]:
+            categoryId = getRowId("categories", category["slug"], {"slug": category["slug"], "name": category["name"]})
+            tables["recipes_to_categories"].append({"recipe_id": recipeId, "category_id": categoryId})
+        for tag in recipe["tags"]:
+            tagId = getRowId("tags", tag["slug"], {"slug": tag["slug"], "name": tag["name"]})
+            tables["recipes_to_tags"].append({"recipe_id": recipeId, "tag_id": tagId})
+        for position, ingredient in enumerate(recipe["recipeIngredient"]):
+            tables["recipes_ingredients"].append({
+                "id": len(tables["recipes_ingredients"]),
+                "recipe_id": recipeId,
+                "position": position,
+                "title": emptyToNull(ingredient["title"]),
+                "note": emptyToNull(ingredient["note"]),
+                "quantity": ingredient["quantity"],
+                "unit_id": getRowId("ingredient_units", ingredient["unit"]["name"], {"name": ingredient["unit"]["name"]}) if ingredient["unit"] else None,
+                "food_id": getRowId("ingredient_foods", ingredient["food"]["name"], {"name": ingredient["food"]["name"]}) if ingredient["food"] else None})
+        for position, step in enumerate(recipe["recipeInstructions"]):
+            tables["recipe_instructions"].append({"id": len(tables["recipe_instructions"]), "recipe_id": recipeId, "position": position,
+                                                  "title": emptyToNull(step["title"]), "text": emptyToNull(step["text"])})
+        for note in recipe["notes"]:
+            tables["notes"].append({"id": len(tables["notes"]), "recipe_id": recipeId,
+                                    "title": emptyToNull(note["title"]), "text": emptyToNull(note["text"])})
+    return tables
+
+def writeBackup(library, backupFilename):
+    images = fake_mealie.buildImages()
+    with zipfile.ZipFile(backupFilename, "w") as archive:
+        archive.writestr("database.json", json.dumps(buildBackupTables(library)))
+        for recipeIndex, recipe in enumerate(library):
+            if recipe["image"]:
+                for imageName in BACKUP_IMAGE_NAMES:
+                    archive.writestr("data/recipes/{}/images/{}".format(recipe["id"], imageName), images[recipeIndex % len(images)])
+    return
+
+def runChecks(workDir, library, categories):
+    problems = []
+    backupFilename = os.path.join(workDir, "backup.zip")
+    writeBackup(library, backupFilename)
+
+    commands = [["build", "-c"] + categories + ["--fromBackup", backupFilename, "--keepArtifacts"],
+                ["lint", "--fromBackup", backupFilename]]
+    for generatorArguments in commands:
+        completed = subprocess.run([sys.executable, run_benchmarks.SCRIPT_FILENAME] + generatorArguments,
+                                   cwd=workDir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        # lint exits with 1 when it finds something
+        if completed.returncode not in (0, 1) or (generatorArguments[0] == "build" and completed.returncode != 0):
+            problems.append("{} failed:\n{}".format(generatorArguments[0], completed.stdout[-2000:]))
+
+    expectedSlugs = {recipe["slug"] for recipe in library
+                     if any(category["slug"] in categories for category in recipe["recipeCategory"])}
+    pageFilenames = glob.glob(os.path.join(workDir, "output", "*", "*.html"))
+    pageSlugs = {os.path.splitext(os.path.basename(pageFilename))[0] for pageFilename in pageFilenames}
+    if pageSlugs != expectedSlugs:
+        problems.append("the book has {} recipe pages, expected {}".format(len(pageSlugs), len(expectedSlugs)))
+    for pageFilename in pageFilenames:
+        with open(pageFilename) as f:
+            if ">None<" in f.read().replace(" ", "").replace("\n", ""):
+                problems.append("{} prints None for a missing field".format(os.path.basename(pageFilename)))
+    return problems
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check building from a Mealie backup zip with null text fields")
+    parser.add_argument("--recipes", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-c", "--categories", nargs="+", default=["dinner", "breakfast"])
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    options = parser.parse_args()
+
+    library = synthetic_library.buildLibrary(options.recipes, options.seed)
+    # The config needs a Mealie URL, but nothing is ever sent to it
+    server = fake_mealie.FakeMealieServer(("127.0.0.1", 0), [], 0)
+    workDir = run_benchmarks.prepareWorkDir(server, options.recipes)
+    server.server_close()
+    problems = runChecks(workDir, library, options.categories)
+    if options.keep:
+        print("Kept " + workDir)
+    else:
+        shutil.rmtree(workDir)
+
+    for problem in problems:
+        print("FAIL: " + problem)
+    if problems:
+        sys.exit(1)
+    print("OK: built and linted {} recipes from a backup with null text fields".format(options.recipes))
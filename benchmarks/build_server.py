@@ -0,0 +1,115 @@
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+
+import fake_mealie
+import run_benchmarks
+import synthetic_library
+
+
+# BUILD SERVER ===========================================================================
+# Time to a finished book for the same requests made two ways against a fake Mealie:
+# a pdf_generator.py run per book, and jobs posted to one `pdf_generator.py --serve`.
+# Both start from an empty work directory. The first request pays for the recipe
+# downloads either way; after that the CLI still starts a new process per book, while
+# the server keeps its templates, recipes, fonts and render workers warm.
+BOOK_REQUESTS = [
+    ("everything", {"categories": synthetic_library.CATEGORIES, "static_pages": True}),
+    ("everything again", {"categories": synthetic_library.CATEGORIES, "static_pages": True}),
+    ("vegetarian", {"categories": synthetic_library.CATEGORIES, "tag": "vegetarian", "title": "Vegetarian"}),
+    ("desserts", {"categories": ["dessert"], "title": "Desserts"}),
+    ("no spicy", {"categories": synthetic_library.CATEGORIES, "removeTags": ["spicy"], "foods": synthetic_library.getCommonFoods(10)}),
+]
+POLL_SECONDS = 0.05
+
+def getCliArguments(spec):
+    cliArguments = ["-c"] + spec["categories"]
+    if spec.get("tag"):
+        cliArguments += ["-t", spec["tag"]]
+    if spec.get("removeTags"):
+        cliArguments += ["--removeTags"] + spec["removeTags"]
+    if spec.get("foods"):
+        cliArguments += ["-f"] + spec["foods"]
+    if spec.get("static_pages"):
+        cliArguments.append("--static_pages")
+    return cliArguments
+
+def timeCliBooks(server, recipeCount, options):
+    workDir = run_benchmarks.prepareWorkDir(server, recipeCount)
+    results = []
+    for requestName, spec in BOOK_REQUESTS:
+        result = run_benchmarks.runGenerator(server, workDir, getCliArguments(spec) + ["-j", str(options.jobs)])
+        results.append((requestName, result["seconds"]))
+    return workDir, results
+
+def startBuildServer(workDir, options):
+    serverProcess = subprocess.Popen([sys.executable, "-u", run_benchmarks.SCRIPT_FILENAME, "--serve", "0", "-j", str(options.jobs)],
+                                     cwd=workDir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in serverProcess.stdout:
+        if line.startswith("Serving builds on "):
+            return serverProcess, line.split()[3].rsplit("/", 1)[0]
+    sys.exit("pdf_generator.py --serve exited before it started serving")
+
+def postJson(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+def timeServerBook(serverUrl, spec):
+    startTime = time.perf_counter()
+    job = postJson(serverUrl + "/jobs", spec)
+    while job["status"] in ("queued", "running"):
+        time.sleep(POLL_SECONDS)
+        with urllib.request.urlopen("{}/jobs/{}".format(serverUrl, job["id"])) as response:
+            job = json.load(response)
+    if job["status"] != "done":
+        sys.exit("Job {} failed: {}".format(job["id"], job.get("error")))
+    with urllib.request.urlopen("{}/jobs/{}/pdf".format(serverUrl, job["id"])) as response:
+        response.read()
+    return time.perf_counter() - startTime, job
+
+def timeServerBooks(server, recipeCount, options):
+    workDir = run_benchmarks.prepareWorkDir(server, recipeCount)
+    serverProcess, serverUrl = startBuildServer(workDir, options)
+    results = []
+    try:
+        for requestName, spec in BOOK_REQUESTS:
+            seconds, job = timeServerBook(serverUrl, spec)
+            results.append((requestName, seconds, job["renderedPages"]))
+    finally:
+        serverProcess.terminate()
+        serverProcess.wait()
+    return workDir, results
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CLI runs with the build server")
+    parser.add_argument("--recipes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    options = parser.parse_args()
+
+    server = fake_mealie.startFakeMealie(synthetic_library.buildLibrary(options.recipes, options.seed), options.latency)
+    try:
+        cliDir, cliResults = timeCliBooks(server, options.recipes, options)
+        serverDir, serverResults = timeServerBooks(server, options.recipes, options)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print("{} recipes, time to a finished book".format(options.recipes))
+    print("  {:<18} {:>9} {:>9} {:>9}".format("", "cli", "server", "rendered"))
+    for (requestName, cliSeconds), (_, serverSeconds, renderedPages) in zip(cliResults, serverResults):
+        print("  {:<18} {:>8.2f}s {:>8.2f}s {:>9}".format(requestName, cliSeconds, serverSeconds, renderedPages))
+    if options.keep:
+        print("Kept {} and {}".format(cliDir, serverDir))
+    else:
+        shutil.rmtree(cliDir)
+        shutil.rmtree(serverDir)
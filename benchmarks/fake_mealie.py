@@ -0,0 +1,136 @@
+import argparse
+import io
+import json
+import math
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from PIL import Image
+
+import synthetic_library
+
+
+# FAKE MEALIE ============================================================================
+# Just enough of the Mealie API for pdf_generator.py: the paged recipe listing with its
+# category/tag filters, full recipes, and recipe images. Every request waits `latency`
+# seconds first to stand in for a real server on the network, and every requested path
+# is kept, query string included, so checks can see what was asked for.
+IMAGE_VARIANTS = 8
+IMAGE_SIZE = (1200, 900)
+
+class FakeMealieServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recipes, latency):
+        super().__init__(address, FakeMealieHandler)
+        self.recipes = {recipe["slug"]: recipe for recipe in recipes}
+        self.latency = latency
+        self.images = buildImages()
+        self.statsLock = threading.Lock()
+        self.resetStats()
+
+    def resetStats(self):
+        with self.statsLock:
+            self.requestCount = 0
+            self.bytesSent = 0
+            self.requestedPaths = []
+        return
+
+    def recordPath(self, path):
+        with self.statsLock:
+            self.requestedPaths.append(path)
+        return
+
+    def recordRequest(self, bodyBytes):
+        with self.statsLock:
+            self.requestCount += 1
+            self.bytesSent += bodyBytes
+        return
+
+    def getUrl(self):
+        return "http://{}:{}".format(*self.server_address)
+
+
+class FakeMealieHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        return
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.recordPath(self.path)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        pathParts = url.path.strip("/").split("/")
+
+        if pathParts == ["api", "recipes"]:
+            self.sendJson(self.getListing(query))
+        elif len(pathParts) == 3 and pathParts[:2] == ["api", "recipes"] and pathParts[2] in self.server.recipes:
+            self.sendJson(self.server.recipes[pathParts[2]])
+        elif len(pathParts) == 6 and pathParts[:3] == ["api", "media", "recipes"]:
+            # /api/media/recipes/{id}/images/{name}.webp
+            recipeIndex = int(pathParts[3].rsplit("-", 1)[1])
+            self.sendBody(self.server.images[recipeIndex % IMAGE_VARIANTS], "image/webp")
+        else:
+            self.send_error(404)
+        return
+
+    def getListing(self, query):
+        recipes = list(self.server.recipes.values())
+        if "categories" in query:
+            recipes = [recipe for recipe in recipes if any(category["slug"] in query["categories"] for category in recipe["recipeCategory"])]
+        if "tags" in query:
+            recipes = [recipe for recipe in recipes if any(tag["slug"] in query["tags"] for tag in recipe["tags"])]
+        perPage = int(query.get("perPage", ["50"])[0])
+        page = int(query.get("page", ["1"])[0])
+        if perPage < 1:
+            perPage = max(len(recipes), 1)
+        return {"page": page,
+                "per_page": perPage,
+                "total": len(recipes),
+                "total_pages": max(math.ceil(len(recipes) / perPage), 1),
+                "items": [synthetic_library.summarizeRecipe(recipe) for recipe in recipes[(page - 1) * perPage:page * perPage]]}
+
+    def sendJson(self, body):
+        self.sendBody(json.dumps(body).encode(), "application/json")
+        return
+
+    def sendBody(self, body, contentType):
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.recordRequest(len(body))
+        return
+
+
+def buildImages():
+    # A handful of photo-sized images, shared between recipes
+    images = []
+    for variant in range(IMAGE_VARIANTS):
+        image = Image.radial_gradient("L").resize(IMAGE_SIZE).convert("RGB")
+        image.paste((40 + variant * 25, 120, 200 - variant * 20), (0, 0, IMAGE_SIZE[0] // 2, IMAGE_SIZE[1] // 3))
+        imageBytes = io.BytesIO()
+        image.save(imageBytes, "WEBP", quality=90)
+        images.append(imageBytes.getvalue())
+    return images
+
+def startFakeMealie(recipes, latency, port=0):
+    server = FakeMealieServer(("127.0.0.1", port), recipes, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic Mealie library")
+    parser.add_argument("--recipes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=9925)
+    args = parser.parse_args()
+
+    server = FakeMealieServer(("127.0.0.1", args.port), synthetic_library.buildLibrary(args.recipes, args.seed), args.latency)
+    print("Serving {} recipes at {} with {}s latency".format(args.recipes, server.getUrl(), args.latency))
+    server.serve_forever()
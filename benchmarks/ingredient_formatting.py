@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import time
+
+import jinja2
+
+import synthetic_library
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdf_generator
+
+
+# INGREDIENT FORMATTING ==================================================================
+# Microbenchmarks for the ingredient lines of recipe pages over a synthetic corpus:
+# formatting quantities with and without the cache, and rendering each recipe's
+# ingredient list with the helpers called from the template versus prerendered lines.
+HELPERS_IN_TEMPLATE = jinja2.Environment().from_string(
+    "{% for ingredient in ingredients %}<div class=\"ingredient-item\">"
+    "{{ convertDecimalToFractionString(ingredient.quantity) }} {{ pluralizeUnit(ingredient.quantity, ingredient.unit) }} "
+    "{{ pluralizeIngredient(ingredient.quantity, ingredient.unit, ingredient.food.name) }}"
+    "{{ getIngredientNoteAppend(ingredient) }}{{ ingredient.note }}</div>{% endfor %}")
+PRERENDERED_LINES = jinja2.Environment().from_string(
+    "{% for ingredient in ingredients %}<div class=\"ingredient-item\">{{ ingredientLines[loop.index0] }}</div>{% endfor %}")
+
+def getUncachedHelpers():
+    return {"convertDecimalToFractionString": pdf_generator.convertDecimalToFractionString.__wrapped__,
+            "pluralizeUnit": pdf_generator.pluralizeUnit,
+            "pluralizeIngredient": pdf_generator.pluralizeIngredient,
+            "getIngredientNoteAppend": pdf_generator.getIngredientNoteAppend}
+
+def getCachedHelpers():
+    return dict(getUncachedHelpers(), convertDecimalToFractionString=pdf_generator.convertDecimalToFractionString)
+
+def clearDisplayCaches():
+    pdf_generator.convertDecimalToFractionString.cache_clear()
+    pdf_generator.pluralizeString.cache_clear()
+    return
+
+def formatQuantitiesUncached(recipes):
+    for recipe in recipes:
+        for ingredient in recipe.recipeIngredient:
+            pdf_generator.convertDecimalToFractionString.__wrapped__(ingredient.quantity)
+    return
+
+def formatQuantitiesCached(recipes):
+    for recipe in recipes:
+        for ingredient in recipe.recipeIngredient:
+            pdf_generator.convertDecimalToFractionString(ingredient.quantity)
+    return
+
+def renderWithUncachedHelpers(recipes):
+    helpers = getUncachedHelpers()
+    for recipe in recipes:
+        HELPERS_IN_TEMPLATE.render(ingredients=recipe.recipeIngredient, **helpers)
+    return
+
+def renderWithCachedHelpers(recipes):
+    helpers = getCachedHelpers()
+    for recipe in recipes:
+        HELPERS_IN_TEMPLATE.render(ingredients=recipe.recipeIngredient, **helpers)
+    return
+
+def renderPrerenderedLines(recipes):
+    for recipe in recipes:
+        ingredientLines = [pdf_generator.formatIngredientLine(ingredient) for ingredient in recipe.recipeIngredient]
+        PRERENDERED_LINES.render(ingredients=recipe.recipeIngredient, ingredientLines=ingredientLines)
+    return
+
+BENCHMARKS = [
+    ("quantities, uncached", formatQuantitiesUncached),
+    ("quantities, cached", formatQuantitiesCached),
+    ("lines, helpers in template", renderWithUncachedHelpers),
+    ("lines, cached helpers", renderWithCachedHelpers),
+    ("lines, prerendered", renderPrerenderedLines),
+]
+
+def timeBenchmark(benchmark, recipes, repeat):
+    # Caches start empty on every repeat, so the cached cases pay for their misses
+    bestSeconds = None
+    for _ in range(repeat):
+        clearDisplayCaches()
+        startTime = time.perf_counter()
+        benchmark(recipes)
+        seconds = time.perf_counter() - startTime
+        bestSeconds = seconds if bestSeconds is None else min(bestSeconds, seconds)
+    return bestSeconds
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingredient line formatting")
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    recipes = [pdf_generator.normalizeRecipe(recipe) for recipe in synthetic_library.buildLibrary(options.recipes, options.seed)]
+    lineCount = sum(len(recipe.recipeIngredient) for recipe in recipes)
+    print("{} ingredient lines from {} recipes, best of {}".format(lineCount, options.recipes, options.repeat))
+    for benchmarkName, benchmark in BENCHMARKS:
+        seconds = timeBenchmark(benchmark, recipes, options.repeat)
+        print("  {:<28} {:>8.1f}ms {:>8.2f}us/line".format(benchmarkName, seconds * 1000, seconds / lineCount * 1e6))
+    print("  quantity cache: {}".format(pdf_generator.convertDecimalToFractionString.cache_info()))
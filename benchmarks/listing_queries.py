@@ -0,0 +1,81 @@
+import argparse
+import math
+import shutil
+import sys
+from urllib.parse import urlparse, parse_qs
+
+import fake_mealie
+import run_benchmarks
+import synthetic_library
+
+
+# LISTING QUERIES ========================================================================
+# Runs dump-ingredients with --categories and --tag against a fake Mealie and checks the
+# requests it made: both filters go to Mealie in the listing's query string, the listing
+# is read a page at a time up to its last page, and only the recipes that match are
+# downloaded in full. Exits with 1 when any of that doesn't hold.
+def recipeMatches(recipe, categories, tag):
+    return (any(category["slug"] in categories for category in recipe["recipeCategory"])
+            and any(organizer["slug"] == tag for organizer in recipe["tags"]))
+
+def checkRequests(requestedPaths, library, categories, tag):
+    problems = []
+    urls = [urlparse(path) for path in requestedPaths]
+    listingQueries = [parse_qs(url.query) for url in urls if url.path == "/api/recipes"]
+    matchingSlugs = {recipe["slug"] for recipe in library if recipeMatches(recipe, categories, tag)}
+    if not listingQueries:
+        return ["the recipe listing was never requested"]
+
+    for query in listingQueries:
+        if sorted(query.get("categories", [])) != sorted(categories):
+            problems.append("listing asked for categories {}, not {}".format(query.get("categories"), categories))
+        if query.get("tags") != [tag]:
+            problems.append("listing asked for tags {}, not {}".format(query.get("tags"), [tag]))
+
+    perPage = int(listingQueries[0].get("perPage", ["0"])[0])
+    if perPage < 1:
+        problems.append("listing asked for perPage={}, the whole library at once".format(perPage))
+    else:
+        pageCount = max(math.ceil(len(matchingSlugs) / perPage), 1)
+        pages = [int(query.get("page", ["0"])[0]) for query in listingQueries]
+        if pageCount < 2:
+            problems.append("only {} recipes match, too few to need a second page; use more --recipes".format(len(matchingSlugs)))
+        if pages != list(range(1, pageCount + 1)):
+            problems.append("listing read pages {}, not 1 to {}".format(pages, pageCount))
+
+    fetchedSlugs = {url.path.rsplit("/", 1)[1] for url in urls if url.path.startswith("/api/recipes/")}
+    if fetchedSlugs - matchingSlugs:
+        problems.append("{} recipes outside the filters were downloaded".format(len(fetchedSlugs - matchingSlugs)))
+    if matchingSlugs - fetchedSlugs:
+        problems.append("{} matching recipes were not downloaded".format(len(matchingSlugs - fetchedSlugs)))
+    # Every listing page repeats the same query, so a wrong filter is only reported once
+    return list(dict.fromkeys(problems))
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the listing queries pdf_generator.py sends to Mealie")
+    parser.add_argument("--recipes", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-c", "--categories", nargs="+", default=["dinner", "dessert", "soup", "side"])
+    parser.add_argument("-t", "--tag", default="quick")
+    options = parser.parse_args()
+
+    library = synthetic_library.buildLibrary(options.recipes, options.seed)
+    server = fake_mealie.startFakeMealie(library, 0)
+    try:
+        workDir = run_benchmarks.prepareWorkDir(server, options.recipes)
+        run_benchmarks.runGenerator(server, workDir, ["dump-ingredients", "-c"] + options.categories + ["-t", options.tag])
+        problems = checkRequests(server.requestedPaths, library, options.categories, options.tag)
+    finally:
+        server.shutdown()
+        server.server_close()
+    shutil.rmtree(workDir)
+
+    for problem in problems:
+        print("FAIL: " + problem)
+    if problems:
+        sys.exit(1)
+    print("OK: {} listing requests and {} recipe downloads for {} recipes".format(
+        sum(1 for path in server.requestedPaths if urlparse(path).path == "/api/recipes"),
+        sum(1 for path in server.requestedPaths if urlparse(path).path.startswith("/api/recipes/")), options.recipes))
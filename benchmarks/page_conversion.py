@@ -0,0 +1,93 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import fake_mealie
+import run_benchmarks
+import synthetic_library
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdf_generator
+
+
+# PAGE CONVERSION ========================================================================
+# Times WeasyPrint turning recipe pages into PDFs inside the benchmark process, with one
+# FontConfiguration and parsed stylesheet shared by every page, and with both built again
+# for each page the way convertHtmlToPdf used to. The pages are rendered from the
+# synthetic library without their pictures, so only the layout and the fonts are timed.
+RECIPE_STYLES_FILENAME = "templates//recipe_page_template.css"
+
+def renderRecipePages(recipes):
+    pdf_generator.loadConfig()
+    pdf_generator.globalIngredientLines = {}
+    for recipeData in recipes:
+        pdf_generator.prepareIngredientLines(recipeData)
+    pageTemplate = pdf_generator.getPageTemplate("recipe_page_template.html")
+    return [pageTemplate.render(data=recipeData, image=None, ingredientLines=pdf_generator.globalIngredientLines[recipeData.slug],
+                                recipeNumber=recipeNumber) for recipeNumber, recipeData in enumerate(recipes, 1)]
+
+def clearSharedStylesheets():
+    pdf_generator.sharedFontConfig = None
+    pdf_generator.stylesheetRegistry.clear()
+    return
+
+def convertWithSharedSetup(pages):
+    # The first page pays for loading the fonts, as it does in a real run
+    clearSharedStylesheets()
+    for htmlContent in pages:
+        pdf_generator.convertHtmlToPdf(htmlContent, RECIPE_STYLES_FILENAME)
+    return
+
+def convertWithSetupPerPage(pages):
+    for htmlContent in pages:
+        clearSharedStylesheets()
+        pdf_generator.convertHtmlToPdf(htmlContent, RECIPE_STYLES_FILENAME)
+    return
+
+BENCHMARKS = [
+    ("setup per page", convertWithSetupPerPage),
+    ("shared setup", convertWithSharedSetup),
+]
+
+def timeBenchmark(benchmark, pages, repeat):
+    bestSeconds = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        benchmark(pages)
+        seconds = time.perf_counter() - startTime
+        bestSeconds = seconds if bestSeconds is None else min(bestSeconds, seconds)
+    return bestSeconds
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark recipe page conversion with and without the shared font configuration")
+    parser.add_argument("--recipes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    options = parser.parse_args()
+
+    recipes = [pdf_generator.normalizeRecipe(recipe) for recipe in synthetic_library.buildLibrary(options.recipes, options.seed)]
+    # The config needs a Mealie URL, but nothing is ever sent to it
+    server = fake_mealie.FakeMealieServer(("127.0.0.1", 0), [], 0)
+    workDir = run_benchmarks.prepareWorkDir(server, options.recipes)
+    server.server_close()
+    previousDir = os.getcwd()
+    os.chdir(workDir)
+    try:
+        pages = renderRecipePages(recipes)
+        print("{} recipe pages, best of {}".format(len(pages), options.repeat))
+        timings = {benchmarkName: timeBenchmark(benchmark, pages, options.repeat) for benchmarkName, benchmark in BENCHMARKS}
+    finally:
+        os.chdir(previousDir)
+    if options.keep:
+        print("Kept " + workDir)
+    else:
+        shutil.rmtree(workDir)
+
+    for benchmarkName, seconds in timings.items():
+        print("  {:<16} {:>9.1f}ms {:>8.1f}ms/page".format(benchmarkName, seconds * 1000, seconds / len(pages) * 1000))
+    print("  {:<16} {:>9.2f}x".format("speedup", timings["setup per page"] / timings["shared setup"]))
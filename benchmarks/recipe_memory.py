@@ -0,0 +1,60 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+import synthetic_library
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdf_generator
+
+
+# RECIPE MEMORY ==========================================================================
+# Memory held for a synthetic library kept as raw API responses versus the normalized
+# recipe model, and the size of recipeCache.json written in either form.
+def measureAllocated(buildValue):
+    gc.collect()
+    tracemalloc.start()
+    value = buildValue()
+    gc.collect()
+    allocatedBytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, allocatedBytes
+
+def loadRawRecipes(payloads):
+    return {recipeSlug: json.loads(payload) for recipeSlug, payload in payloads.items()}
+
+def loadNormalizedRecipes(payloads):
+    pdf_generator.internedValues.clear()
+    return {recipeSlug: pdf_generator.normalizeRecipe(json.loads(payload)) for recipeSlug, payload in payloads.items()}
+
+def getRawStoreBytes(rawRecipes):
+    return len(json.dumps({"items": rawRecipes, "updated": {recipeSlug: "2024-01-01T00:00:00" for recipeSlug in rawRecipes}}))
+
+def getNormalizedStoreBytes(normalizedRecipes):
+    items = {recipeSlug: pdf_generator.recipeToStoreEntry(recipe) for recipeSlug, recipe in normalizedRecipes.items()}
+    store = {"format": pdf_generator.RECIPE_STORE_FORMAT, "items": items, "updated": {recipeSlug: "2024-01-01T00:00:00" for recipeSlug in items}}
+    return len(json.dumps(store, separators=(",", ":")))
+
+def printMeasurement(name, rawBytes, normalizedBytes, recipeCount):
+    print("  {:<16} {:>8.1f} MB -> {:>6.1f} MB  ({:.0f} -> {:.0f} bytes/recipe, {:.1f}x smaller)".format(
+        name, rawBytes / 1e6, normalizedBytes / 1e6, rawBytes / recipeCount, normalizedBytes / recipeCount, rawBytes / normalizedBytes))
+    return
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recipe memory and store size")
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    payloads = {recipe["slug"]: json.dumps(recipe) for recipe in synthetic_library.buildLibrary(options.recipes, options.seed)}
+    rawRecipes, rawBytes = measureAllocated(lambda: loadRawRecipes(payloads))
+    normalizedRecipes, normalizedBytes = measureAllocated(lambda: loadNormalizedRecipes(payloads))
+
+    print("{} recipes, raw API responses -> normalized model".format(options.recipes))
+    printMeasurement("in memory", rawBytes, normalizedBytes, options.recipes)
+    printMeasurement("recipeCache.json", getRawStoreBytes(rawRecipes), getNormalizedStoreBytes(normalizedRecipes), options.recipes)
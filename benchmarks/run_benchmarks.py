@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_mealie
+import synthetic_library
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdf_generator
+
+
+# BENCHMARKS =============================================================================
+# Runs pdf_generator.py, exactly as a user would, against a fake Mealie serving a
+# synthetic library, and keeps the wall time of each case along with the stage timings
+# from the run's run_report.json. The library, latency and arguments are fixed by the
+# options below, so results saved on two commits can be put side by side with --compare.
+#
+#   fetch       --ingredientDump from an empty recipe store: listing and recipe
+#               downloads
+#   fetchSerial the same with --fetchWorkers 1, one request at a time; its time is
+#               printed next to fetch's, which uses the default number of workers
+#   build       the whole book from scratch: fetch, images, manifests/index, Jinja,
+#               WeasyPrint and merging
+#   rebuild     the same book again, with the recipe store and caches warm
+#   jinja       every recipe page rendered to HTML in process, with no fetching, images
+#               or WeasyPrint, in the build's directory so it uses the same templates
+#   merge       the book offline with the render cache off, so every page is rendered
+#               to its own PDF and merged
+#   singlePass  the same book with --singlePass, written as one document; its time
+#               and book size are printed next to merge's
+#
+# The index case runs once, in process, on its own library with a large food list:
+#
+#   index       the manifests and the book index for every category, with every food
+#               on the index page, without fetching or rendering anything
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_FILENAME = os.path.join(REPO_DIR, "pdf_generator.py")
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+INDEX_FOOD_COUNT = 20
+INDEX_CASE_RECIPE_COUNT = 5000
+INDEX_CASE_FOOD_COUNT = 3000
+REPORT_COUNTERS = ["pdfPages", "bookBytes", "pagesRendered", "pagesShared", "renderCacheHits", "renderCacheMisses", "optimizedBookBytes"]
+
+CONFIG_TEMPLATE = """[cookbook]
+title = Benchmark Cookbook
+sub_title = {recipeCount} synthetic recipes
+dedication = For everyone who waited on a build
+
+[mealie_instance]
+url = {url}
+api_token = benchmark
+
+[index_page]
+min_recipes = 2
+max_recipes = 0
+"""
+
+def prepareWorkDir(server, recipeCount):
+    workDir = tempfile.mkdtemp(prefix="cookbook-bench-")
+    shutil.copytree(os.path.join(REPO_DIR, "templates"), os.path.join(workDir, "templates"))
+    shutil.copytree(os.path.join(REPO_DIR, "fonts"), os.path.join(workDir, "fonts"))
+    with open(os.path.join(workDir, "config.ini"), "w") as f:
+        f.write(CONFIG_TEMPLATE.format(recipeCount=recipeCount, url=server.getUrl()))
+    return workDir
+
+def getBookArguments(options, singlePass=False):
+    # --singlePass lays the book out in one process, so it takes no -j
+    renderArguments = ["--singlePass"] if singlePass else ["-j", str(options.jobs)]
+    bookArguments = ["-c"] + synthetic_library.CATEGORIES + ["--static_pages"] + renderArguments
+    bookArguments += ["-f"] + synthetic_library.getCommonFoods(INDEX_FOOD_COUNT)
+    return bookArguments + shlex.split(options.extra)
+
+def runGenerator(server, workDir, generatorArguments):
+    server.resetStats()
+    startTime = time.perf_counter()
+    with open(os.path.join(workDir, "generator.log"), "a") as logFile:
+        completed = subprocess.run([sys.executable, SCRIPT_FILENAME] + generatorArguments, cwd=workDir, stdout=logFile, stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - startTime
+    if completed.returncode != 0:
+        sys.exit("pdf_generator.py {} failed, see {}".format(" ".join(generatorArguments), os.path.join(workDir, "generator.log")))
+    result = {"seconds": seconds, "requests": server.requestCount, "bytes": server.bytesSent}
+    reportFilename = os.path.join(workDir, "run_report.json")
+    if os.path.exists(reportFilename):
+        with open(reportFilename) as f:
+            result["report"] = summarizeRunReport(json.load(f))
+        os.remove(reportFilename)
+    return result
+
+def summarizeRunReport(report):
+    return {"stages": {stageName: stage["seconds"] for stageName, stage in report["stages"].items()},
+            "firstRecipePageSeconds": report.get("firstRecipePageSeconds"),
+            "peakMemoryMB": report.get("peakMemoryMB"),
+            "counters": {counterName: report["counters"][counterName] for counterName in REPORT_COUNTERS if counterName in report["counters"]}}
+
+def runSize(recipeCount, options):
+    server = fake_mealie.startFakeMealie(synthetic_library.buildLibrary(recipeCount, options.seed), options.latency)
+    runs = {"fetch": [], "fetchSerial": [], "build": [], "rebuild": [], "jinja": [], "merge": [], "singlePass": []}
+    try:
+        for repeat in range(options.repeat):
+            print("{} recipes, run {}/{}".format(recipeCount, repeat + 1, options.repeat))
+            fetchDir = prepareWorkDir(server, recipeCount)
+            runs["fetch"].append(runGenerator(server, fetchDir, ["--ingredientDump", "--runReport"]))
+            serialFetchDir = prepareWorkDir(server, recipeCount)
+            runs["fetchSerial"].append(runGenerator(server, serialFetchDir, ["--ingredientDump", "--runReport", "--fetchWorkers", "1"]))
+            buildDir = prepareWorkDir(server, recipeCount)
+            runs["build"].append(runGenerator(server, buildDir, getBookArguments(options)))
+            runs["rebuild"].append(runGenerator(server, buildDir, getBookArguments(options)))
+            runs["jinja"].append(runJinjaCase(buildDir, recipeCount, options))
+            runs["merge"].append(runGenerator(server, buildDir, getBookArguments(options) + ["--offline", "--noCache"]))
+            runs["singlePass"].append(runGenerator(server, buildDir, getBookArguments(options, singlePass=True) + ["--offline"]))
+            if not options.keep:
+                shutil.rmtree(fetchDir)
+                shutil.rmtree(serialFetchDir)
+                shutil.rmtree(buildDir)
+            else:
+                print("  kept {}, {} and {}".format(fetchDir, serialFetchDir, buildDir))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {caseName: summarizeRuns(caseRuns) for caseName, caseRuns in runs.items()}
+
+def summarizeRuns(caseRuns):
+    # The median run is kept whole so its stage timings stay consistent with each other
+    medianRun = sorted(caseRuns, key=lambda run: run["seconds"])[len(caseRuns) // 2]
+    return dict(medianRun, allSeconds=[round(run["seconds"], 3) for run in caseRuns])
+
+def runJinjaCase(workDir, recipeCount, options):
+    recipes = [pdf_generator.normalizeRecipe(recipe) for recipe in synthetic_library.buildLibrary(recipeCount, options.seed)]
+    previousDir = os.getcwd()
+    os.chdir(workDir)
+    try:
+        pdf_generator.loadConfig()
+        pdf_generator.globalRecipeImages = {}
+        pdf_generator.globalIngredientLines = {}
+        for recipeData in recipes:
+            pdf_generator.prepareIngredientLines(recipeData)
+        pdf_generator.pageTemplates.clear()
+        pageTemplate = pdf_generator.getPageTemplate("recipe_page_template.html")
+        startTime = time.perf_counter()
+        for recipeNumber, recipeData in enumerate(recipes, 1):
+            pageTemplate.render(data=recipeData, image=pdf_generator.getRecipeImageSource(recipeData),
+                                ingredientLines=pdf_generator.globalIngredientLines[recipeData.slug], recipeNumber=recipeNumber)
+        seconds = time.perf_counter() - startTime
+    finally:
+        os.chdir(previousDir)
+    return {"seconds": seconds, "pages": len(recipes)}
+
+def runIndexCase(options):
+    print("index, {} recipes and {} foods".format(options.indexRecipes, options.indexFoods))
+    library = synthetic_library.buildLibrary(options.indexRecipes, options.seed, options.indexFoods)
+    foods = synthetic_library.getFoods(options.indexFoods)
+    pdf_generator.args = pdf_generator.parseArguments(["build", "-c"] + synthetic_library.CATEGORIES + ["-f"] + foods)
+    # The index page limits from CONFIG_TEMPLATE
+    pdf_generator.MIN_RECIPES, pdf_generator.MAX_RECIPES = 2, 0
+    pdf_generator.globalRecipeCache = {"items": {recipe["slug"]: pdf_generator.normalizeRecipe(recipe) for recipe in library}}
+    pdf_generator.runMetrics = pdf_generator.newRunMetrics()
+    startTime = time.perf_counter()
+    pdf_generator.buildBookManifests()
+    pdf_generator.buildBookIndex()
+    seconds = time.perf_counter() - startTime
+    return {"seconds": seconds, "indexEntries": len(pdf_generator.globalIndexCatalog), "report": summarizeRunReport(pdf_generator.runMetrics)}
+
+def getCommitLabel():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if dirty else commit
+
+def runBenchmarks(options):
+    results = {"label": options.label or getCommitLabel(),
+               "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+               "python": sys.version.split()[0],
+               "platform": platform.platform(),
+               "cpuCount": os.cpu_count(),
+               "settings": {"latency": options.latency, "seed": options.seed, "jobs": options.jobs, "extra": options.extra, "repeat": options.repeat,
+                            "indexRecipes": options.indexRecipes, "indexFoods": options.indexFoods},
+               "sizes": {}}
+    for recipeCount in options.sizes:
+        results["sizes"][str(recipeCount)] = runSize(recipeCount, options)
+        printSize(recipeCount, results["sizes"][str(recipeCount)])
+    if options.indexRecipes:
+        results["index"] = runIndexCase(options)
+        printCase("index", results["index"])
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    resultsFilename = os.path.join(RESULTS_DIR, results["label"] + ".json")
+    with open(resultsFilename, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Results written to {}".format(resultsFilename))
+    return
+
+def printSize(recipeCount, sizeResults):
+    print("{} recipes".format(recipeCount))
+    for caseName, caseResult in sizeResults.items():
+        printCase(caseName, caseResult)
+    if "fetch" in sizeResults and "fetchSerial" in sizeResults:
+        printFetchComparison(sizeResults["fetch"], sizeResults["fetchSerial"])
+    if "merge" in sizeResults and "singlePass" in sizeResults:
+        printMergeComparison(sizeResults["merge"], sizeResults["singlePass"])
+    return
+
+def printFetchComparison(fetchResult, serialFetchResult):
+    print("  {:<11} {:>10} {:>10}".format("", "workers 1", "default"))
+    print("  {:<11} {:>9.2f}s {:>9.2f}s  {:.1f}x faster".format("fetch", serialFetchResult["seconds"], fetchResult["seconds"],
+                                                              serialFetchResult["seconds"] / fetchResult["seconds"]))
+    return
+
+def printMergeComparison(mergeResult, singlePassResult):
+    print("  {:<11} {:>10} {:>10}".format("", "merge", "singlePass"))
+    print("  {:<11} {:>9.2f}s {:>9.2f}s".format("time", mergeResult["seconds"], singlePassResult["seconds"]))
+    mergeBytes = mergeResult.get("report", {}).get("counters", {}).get("bookBytes")
+    singlePassBytes = singlePassResult.get("report", {}).get("counters", {}).get("bookBytes")
+    if mergeBytes and singlePassBytes:
+        print("  {:<11} {:>8.2f}MB {:>8.2f}MB".format("book size", mergeBytes / 1e6, singlePassBytes / 1e6))
+    return
+
+def printCase(caseName, caseResult):
+    if "requests" in caseResult:
+        print("  {:<11} {:>9.2f}s  {} requests".format(caseName, caseResult["seconds"], caseResult["requests"]))
+    else:
+        print("  {:<11} {:>9.2f}s".format(caseName, caseResult["seconds"]))
+    for stageName, seconds in sorted(caseResult.get("report", {}).get("stages", {}).items()):
+        print("    {:<15} {:>9.2f}s".format(stageName, seconds))
+    if caseResult.get("report", {}).get("firstRecipePageSeconds") is not None:
+        print("    {:<15} {:>9.2f}s".format("first page", caseResult["report"]["firstRecipePageSeconds"]))
+    if caseResult.get("report", {}).get("peakMemoryMB") is not None:
+        print("    {:<15} {:>8.0f} MB".format("peak memory", caseResult["report"]["peakMemoryMB"]))
+    return
+
+
+# COMPARING ==============================================================================
+def compareResults(baseFilename, newFilename):
+    with open(baseFilename) as f:
+        base = json.load(f)
+    with open(newFilename) as f:
+        new = json.load(f)
+    if base["settings"] != new["settings"]:
+        print("Warning: the runs used different settings\n  {}\n  {}".format(base["settings"], new["settings"]))
+    print("{:<28} {:>10} {:>10} {:>8}".format("", base["label"], new["label"], "ratio"))
+    for size in base["sizes"]:
+        if size not in new["sizes"]:
+            continue
+        for caseName, baseCase in base["sizes"][size].items():
+            newCase = new["sizes"][size].get(caseName)
+            if newCase is not None:
+                compareCase("{} {}".format(size, caseName), baseCase, newCase)
+    if "index" in base and "index" in new:
+        compareCase("index", base["index"], new["index"])
+    return
+
+def compareCase(name, baseCase, newCase):
+    printComparison(name, baseCase["seconds"], newCase["seconds"])
+    baseStages = baseCase.get("report", {}).get("stages", {})
+    newStages = newCase.get("report", {}).get("stages", {})
+    for stageName in sorted(set(baseStages) | set(newStages)):
+        printComparison("  " + stageName, baseStages.get(stageName), newStages.get(stageName))
+    baseReport, newReport = baseCase.get("report", {}), newCase.get("report", {})
+    if baseReport.get("firstRecipePageSeconds") is not None or newReport.get("firstRecipePageSeconds") is not None:
+        printComparison("  first page", baseReport.get("firstRecipePageSeconds"), newReport.get("firstRecipePageSeconds"))
+    if baseReport.get("peakMemoryMB") is not None or newReport.get("peakMemoryMB") is not None:
+        printComparison("  peak memory", baseReport.get("peakMemoryMB"), newReport.get("peakMemoryMB"), "{:.0f} MB")
+    return
+
+def printComparison(name, baseValue, newValue, valueFormat="{:.2f}s"):
+    baseText = valueFormat.format(baseValue) if baseValue is not None else "-"
+    newText = valueFormat.format(newValue) if newValue is not None else "-"
+    ratioText = "{:.2f}x".format(newValue / baseValue) if baseValue and newValue is not None else ""
+    print("{:<28} {:>10} {:>10} {:>8}".format(name, baseText, newText, ratioText))
+    return
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pdf_generator.py against a synthetic Mealie library")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--indexRecipes", type=int, default=INDEX_CASE_RECIPE_COUNT, help="recipes in the index case, 0 to skip it")
+    parser.add_argument("--indexFoods", type=int, default=INDEX_CASE_FOOD_COUNT, help="foods in the index case's library and on its index page")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--extra", default="", help="extra arguments passed to every book build")
+    parser.add_argument("--label", help="name for the results file, defaults to the current commit")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    options = parser.parse_args()
+
+    if options.compare:
+        compareResults(*options.compare)
+    else:
+        runBenchmarks(options)
@@ -0,0 +1,90 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import fake_mealie
+import run_benchmarks
+import synthetic_library
+
+
+# STARTUP ================================================================================
+# Wall time of each pdf_generator.py command on a small offline library, and how much of
+# it went to imports. The recipe store is filled once from a fake Mealie, then every
+# case runs with --offline so the network stays out of the numbers. --legacy runs the
+# same cases with the flags from before the subcommands, and --script points at another
+# copy of pdf_generator.py, so an older commit can be timed the same way.
+CASES = [
+    ("build", ["build", "-c", "dessert", "--offline"], ["-c", "dessert", "--offline"]),
+    ("recipe", ["recipe", "recipe-00000", "--offline"], ["-r", "recipe-00000", "--offline"]),
+    ("static", ["static"], ["--just_static_pages"]),
+    ("lint", ["lint", "--offline"], ["--find_step_issues", "--find_title_issues", "--offline"]),
+    ("dump-ingredients", ["dump-ingredients", "--offline"], ["--ingredientDump", "--offline"]),
+]
+HEAVY_MODULES = ["weasyprint", "PyPDF2", "PIL", "jinja2", "requests", "pikepdf"]
+
+def runCase(scriptFilename, workDir, generatorArguments, importTime=False):
+    interpreterArguments = ["-X", "importtime"] if importTime else []
+    startTime = time.perf_counter()
+    completed = subprocess.run([sys.executable] + interpreterArguments + [scriptFilename] + generatorArguments,
+                               cwd=workDir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - startTime
+    # lint exits with 1 when it finds something
+    if completed.returncode not in (0, 1):
+        sys.exit("pdf_generator.py {} failed:\n{}".format(" ".join(generatorArguments), completed.stderr))
+    return seconds, completed.stderr
+
+def summarizeImports(importLog):
+    # -X importtime prints "import time: self | cumulative | name", with nested
+    # imports indented under the module that pulled them in
+    importSeconds = 0
+    heavyModules = set()
+    for line in importLog.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        selfTime, cumulativeTime, moduleName = line[len("import time:"):].split("|")
+        if not cumulativeTime.strip().isdigit():
+            continue
+        if not moduleName.startswith("  "):
+            importSeconds += int(cumulativeTime) / 1e6
+        if moduleName.strip() in HEAVY_MODULES:
+            heavyModules.add(moduleName.strip())
+    return importSeconds, sorted(heavyModules)
+
+def timeCase(scriptFilename, workDir, generatorArguments, repeat):
+    bestSeconds = min(runCase(scriptFilename, workDir, generatorArguments)[0] for _ in range(repeat))
+    importSeconds, heavyModules = summarizeImports(runCase(scriptFilename, workDir, generatorArguments, importTime=True)[1])
+    return bestSeconds, importSeconds, heavyModules
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time how long each pdf_generator.py command takes to start and finish")
+    parser.add_argument("--recipes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy", action="store_true", help="use the flags from before the subcommands")
+    parser.add_argument("--script", default=run_benchmarks.SCRIPT_FILENAME, help="pdf_generator.py to time")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    options = parser.parse_args()
+    scriptFilename = os.path.abspath(options.script)
+
+    server = fake_mealie.startFakeMealie(synthetic_library.buildLibrary(options.recipes, options.seed), 0)
+    try:
+        workDir = run_benchmarks.prepareWorkDir(server, options.recipes)
+        runCase(scriptFilename, workDir, ["--ingredientDump"])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print("{} recipes offline, best of {}{}".format(options.recipes, options.repeat, ", legacy flags" if options.legacy else ""))
+    print("  {:<18} {:>9} {:>9}  {}".format("", "total", "imports", "heavy modules loaded"))
+    for caseName, commandArguments, legacyArguments in CASES:
+        seconds, importSeconds, heavyModules = timeCase(scriptFilename, workDir, legacyArguments if options.legacy else commandArguments, options.repeat)
+        print("  {:<18} {:>7.0f}ms {:>7.0f}ms  {}".format(caseName, seconds * 1000, importSeconds * 1000, ", ".join(heavyModules) or "-"))
+    if options.keep:
+        print("Kept " + workDir)
+    else:
+        shutil.rmtree(workDir)
@@ -0,0 +1,135 @@
+import random
+
+
+# SYNTHETIC LIBRARY ======================================================================
+# Builds a made-up Mealie library shaped like the /api/recipes/{slug} payloads the
+# templates read. The same size and seed always give the same library, so benchmark
+# runs on different commits build the same book.
+CATEGORIES = ["breakfast", "lunch", "dinner", "side", "soup", "quick-bread", "dessert", "sauce"]
+TAGS = ["quick", "make-ahead", "vegetarian", "vegan", "gluten-free", "grilling", "holiday",
+        "kid-friendly", "freezer", "one-pot", "spicy", "summer", "winter", "pumpkin",
+        "chicken", "proofing-needed", "moms-recipes", "weeknight", "potluck", "brunch"]
+UNITS = [None, "cup", "tablespoon", "teaspoon", "ounce", "pound", "clove", "pinch", "can", "slice", "stick"]
+FOODS = ["flour", "sugar", "brown sugar", "butter", "egg", "milk", "salt", "black pepper",
+         "olive oil", "garlic", "onion", "carrot", "celery", "potato", "tomato", "chicken thighs",
+         "chicken breast", "ground beef", "pork shoulder", "rice", "pasta", "parmesan", "cheddar",
+         "cream cheese", "heavy cream", "baking soda", "baking powder", "vanilla", "cinnamon",
+         "nutmeg", "cumin", "paprika", "chili powder", "oregano", "basil", "thyme", "rosemary",
+         "lemon", "lime", "apple", "banana", "pumpkin", "walnuts", "pecans", "chocolate chips",
+         "honey", "maple syrup", "soy sauce", "vinegar", "mustard", "mayonnaise", "chickpeas",
+         "black beans", "spinach", "kale", "mushrooms", "bell pepper", "jalapeno", "cilantro",
+         "green onion", "ginger", "coconut milk", "chicken stock", "beef stock", "yeast", "oats"]
+QUANTITIES = [None, 0, 1, 1, 2, 3, 4, 0.25, 0.333, 0.5, 0.75, 1.5, 2.5]
+WORDS = ["stir", "the", "mixture", "until", "combined", "and", "bake", "at", "350", "°F",
+         "for", "minutes", "add", "to", "a", "large", "bowl", "whisk", "together", "heat",
+         "pan", "over", "medium", "simmer", "gently", "season", "with", "salt", "pepper",
+         "fold", "in", "remaining", "ingredients", "let", "rest", "before", "serving",
+         "cover", "chill", "overnight", "golden", "brown", "edges", "set", "aside"]
+
+
+def buildLibrary(recipeCount, seed=0, foodCount=len(FOODS)):
+    randomizer = random.Random("{}-{}".format(seed, recipeCount))
+    foods = getFoods(foodCount)
+    return [buildRecipe(randomizer, recipeIndex, foods) for recipeIndex in range(recipeCount)]
+
+def buildRecipe(randomizer, recipeIndex, foods=FOODS):
+    recipeSlug = "recipe-{:05d}".format(recipeIndex)
+    categorySlug = randomizer.choice(CATEGORIES)
+    hasImage = randomizer.random() < 0.9
+    return {
+        "id": "00000000-0000-0000-0000-{:012d}".format(recipeIndex),
+        "slug": recipeSlug,
+        "name": buildSentence(randomizer, 2, 5).rstrip(".").title(),
+        "description": buildSentence(randomizer, 0, 25),
+        "image": "img{:05d}".format(recipeIndex) if hasImage else None,
+        "recipeCategory": [buildOrganizer(categorySlug)],
+        "tags": [buildOrganizer(tagSlug) for tagSlug in sorted(randomizer.sample(TAGS, randomizer.randint(0, 4)))],
+        "tools": [],
+        "recipeYield": "{} servings".format(randomizer.randint(1, 12)),
+        "totalTime": randomizer.choice([None, "", "45 minutes", "1 hour 30 minutes"]),
+        "prepTime": randomizer.choice([None, "", "15 minutes", "20 minutes"]),
+        "performTime": randomizer.choice([None, "", "30 minutes", "1 hour"]),
+        "recipeIngredient": [buildIngredient(randomizer, foods) for _ in range(randomizer.randint(3, 18))],
+        "recipeInstructions": [buildInstruction(randomizer, stepIndex) for stepIndex in range(randomizer.randint(2, 12))],
+        "notes": [{"title": buildSentence(randomizer, 1, 3).rstrip("."), "text": buildSentence(randomizer, 5, 30) + "\n" + buildSentence(randomizer, 5, 20)}
+                  for _ in range(randomizer.choice([0, 0, 1, 2]))],
+        "dateUpdated": "2024-01-01T00:00:00",
+        "updatedAt": "2024-01-01T00:00:00",
+        # The rest is what Mealie sends that the book never reads. None of it draws on
+        # the randomizer, so libraries match the ones generated before it was added.
+        "userId": "00000000-0000-0000-0000-000000000001",
+        "groupId": "00000000-0000-0000-0000-000000000002",
+        "rating": [None, 3, 4, 5][recipeIndex % 4],
+        "orgURL": "https://example.com/recipes/{}".format(recipeSlug),
+        "dateAdded": "2023-06-01",
+        "createdAt": "2023-06-01T00:00:00",
+        "recipeServings": 0,
+        "recipeYieldQuantity": 0,
+        "cookTime": None,
+        "lastMade": None,
+        "nutrition": {"calories": str(100 + recipeIndex % 800), "fatContent": "", "proteinContent": "", "carbohydrateContent": "",
+                      "fiberContent": "", "sodiumContent": "", "sugarContent": "", "cholesterolContent": "", "saturatedFatContent": ""},
+        "settings": {"public": True, "showNutrition": False, "showAssets": False, "landscapeView": False,
+                     "disableComments": False, "disableAmount": False, "locked": False},
+        "assets": [],
+        "comments": [],
+        "extras": {},
+    }
+
+def buildOrganizer(slug):
+    return {"id": slug, "name": slug.replace("-", " ").title(), "slug": slug}
+
+def buildIngredient(randomizer, foods=FOODS):
+    unitName = randomizer.choice(UNITS)
+    foodName = randomizer.choice(foods)
+    quantity = randomizer.choice(QUANTITIES)
+    if randomizer.random() < 0.05:
+        # Free text ingredients have no food or unit
+        return {"title": None, "quantity": 0, "unit": None, "food": None, "note": buildSentence(randomizer, 2, 6).rstrip(".")}
+    return {
+        "title": buildSentence(randomizer, 1, 3).rstrip(".") if randomizer.random() < 0.05 else None,
+        "quantity": quantity,
+        "unit": buildUnit(unitName) if unitName else None,
+        "food": buildFood(foodName),
+        "note": randomizer.choice(["", "", "", "chopped", "(about 2 cups)", "divided", "softened", "to taste"]),
+        "isFood": True,
+        "disableAmount": False,
+        "display": "",
+        "originalText": None,
+        "referenceId": "00000000-0000-0000-0000-000000000000",
+    }
+
+def buildUnit(unitName):
+    return {"id": unitName, "name": unitName, "pluralName": None, "description": "", "extras": {}, "fraction": True,
+            "abbreviation": "", "pluralAbbreviation": "", "useAbbreviation": False, "aliases": [],
+            "createdAt": "2023-06-01T00:00:00", "updateAt": "2023-06-01T00:00:00"}
+
+def buildFood(foodName):
+    return {"id": foodName, "name": foodName, "pluralName": None, "description": "", "extras": {}, "labelId": None,
+            "aliases": [], "label": None, "createdAt": "2023-06-01T00:00:00", "updateAt": "2023-06-01T00:00:00"}
+
+def buildInstruction(randomizer, stepIndex):
+    return {
+        "id": "step-{}".format(stepIndex),
+        "title": buildSentence(randomizer, 1, 3).rstrip(".") if randomizer.random() < 0.1 else "",
+        "text": buildSentence(randomizer, 6, 60),
+        "ingredientReferences": [],
+    }
+
+def buildSentence(randomizer, minWords, maxWords):
+    wordCount = randomizer.randint(minWords, maxWords)
+    if wordCount == 0:
+        return ""
+    return " ".join(randomizer.choice(WORDS) for _ in range(wordCount)).capitalize() + "."
+
+def summarizeRecipe(recipe):
+    # The listing endpoint leaves out ingredients, steps and notes
+    return {key: value for key, value in recipe.items()
+            if key not in ("recipeIngredient", "recipeInstructions", "notes", "tools", "nutrition", "settings", "assets", "comments", "extras")}
+
+def getCommonFoods(count):
+    return FOODS[:count]
+
+def getFoods(foodCount):
+    # Past the named foods, numbered ones stand in for a large Mealie food list
+    return FOODS[:foodCount] + ["food {:05d}".format(foodIndex) for foodIndex in range(len(FOODS), foodCount)]
@@ -1,20 +1,45 @@
 import json
+import io
 import os
 import shutil
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
+import sys
+import hashlib
+import functools
+import pathlib
+import dataclasses
+import time
+import threading
+import contextlib
+import cProfile
+import pstats
+import zlib
+import zipfile
+# WeasyPrint, PyPDF2, Pillow, Jinja, requests and the process pool are imported by the
+# functions that use them, so commands that never render, merge or fetch skip loading them
 from decimal import Decimal
-from PyPDF2 import PdfMerger
 from fractions import Fraction
-import jinja2
-import requests
+from concurrent.futures import ThreadPoolExecutor
+import collections
 import argparse
 import math
+import queue
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import re
 import configparser
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak memory is left out of the run report there
+    resource = None
 
 
 # DISPLAY ================================================================================
+# A library only has a few dozen distinct quantities and units, so their formatted forms
+# are cached rather than rebuilt with Decimal/Fraction on every ingredient line.
+DISPLAY_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=DISPLAY_CACHE_SIZE)
 def convertDecimalToFractionString(decString):
     finalString = ""
     if decString:
@@ -51,14 +76,15 @@ def intToRoman(num):
     return (thousands + hundreds + tens + ones)
 
 def getIngredientNoteAppend(ingredient):
-    note = ingredient["note"]
-    if note == '' or note == 'None' or (ingredient["unit"] == None and ingredient["food"] == None):
+    note = ingredient.note
+    if note == '' or note == 'None' or (ingredient.unit == None and ingredient.food == None):
         return ""
     elif note[0] == '(':
         return " "
     else:
         return ", "
 
+@functools.lru_cache(maxsize=DISPLAY_CACHE_SIZE)
 def pluralizeString(stringToPluralize):
     stringPluralized = stringToPluralize
     if stringToPluralize[-1] in ['h', 's', 'o']:
@@ -70,39 +96,174 @@ def pluralizeString(stringToPluralize):
 
 def pluralizeUnit(quantity, unit):
     if unit:
-        if quantity and quantity > 1 and unit != None and unit["name"] != "":
-            return pluralizeString(unit["name"])
+        if quantity and quantity > 1 and unit != None and unit.name != "":
+            return pluralizeString(unit.name)
         else:
-            return unit["name"]
+            return unit.name
     else:
         return ""
 
 def pluralizeIngredient(quantity, unit, ingredientName):
-    if quantity and quantity > 1 and (unit is None or unit["name"] in ["", "None"]):
+    if quantity and quantity > 1 and (unit is None or unit.name in ["", "None"]):
         return pluralizeString(ingredientName)
     else:
         return ingredientName
 
+def formatIngredientLine(ingredient):
+    # The whole ingredient line as the recipe page prints it
+    quantity = ingredient.quantity
+    unit = ingredient.unit
+    foodName = ingredient.food.name if ingredient.food else ""
+    return "{} {} {}{}{}".format(convertDecimalToFractionString(quantity),
+                                 pluralizeUnit(quantity, unit),
+                                 pluralizeIngredient(quantity, unit, foodName) if foodName else "",
+                                 getIngredientNoteAppend(ingredient),
+                                 ingredient.note)
+
+def prepareIngredientLines(recipeData):
+    # Kept out of the recipe data itself, like the image paths, so the recipe store
+    # never holds formatted text from an older version of the script
+    globalIngredientLines[recipeData.slug] = [formatIngredientLine(ingredient) for ingredient in recipeData.recipeIngredient or ()]
+    return
+
 # ORGANIZATIONAL DATA ====================================================================
 def generateCategoryCache():
     cache = {}
     for recipe in globalRecipeCache.get("items"):
-        for category in globalRecipeCache.get("items")[recipe].get("recipeCategory"):
-            cache[category.get("slug")] = category
+        for category in globalRecipeCache.get("items")[recipe].recipeCategory:
+            cache[category.slug] = category
     return cache
 
 def generateTagCache():
     cache = {}
     for recipe in globalRecipeCache.get("items"):
-        for tag in globalRecipeCache.get("items")[recipe].get("tags"):
-            cache[tag.get("slug")] = tag
+        for tag in globalRecipeCache.get("items")[recipe].tags:
+            cache[tag.slug] = tag
     return cache
 
 def getTagName(tagSlug):
-    return globalTagCache[tagSlug].get("name")
+    return globalTagCache[tagSlug].name
 
 def getCategoryName(categorySlug):
-    return globalCategoryCache[categorySlug].get("name")
+    return globalCategoryCache[categorySlug].name
+
+
+# RECIPE MODEL ===========================================================================
+# Recipes are cut down from Mealie's API responses to just what the book reads, keeping
+# the API's field names so the templates read them the same way. Tags, categories, units
+# and foods are interned, so every recipe with "chicken" shares one Food("chicken").
+# Listing summaries have no ingredients, steps or notes; those stay None until the full
+# recipe is loaded.
+@dataclasses.dataclass(slots=True)
+class Organizer:
+    slug: str
+    name: str
+
+@dataclasses.dataclass(slots=True)
+class Unit:
+    name: str
+
+@dataclasses.dataclass(slots=True)
+class Food:
+    name: str
+
+@dataclasses.dataclass(slots=True)
+class Ingredient:
+    title: str
+    quantity: float
+    unit: Unit
+    food: Food
+    note: str
+
+@dataclasses.dataclass(slots=True)
+class Step:
+    title: str
+    text: str
+
+@dataclasses.dataclass(slots=True)
+class Note:
+    title: str
+    text: str
+
+@dataclasses.dataclass(slots=True)
+class Recipe:
+    id: str
+    slug: str
+    name: str
+    description: str
+    image: str
+    totalTime: str
+    prepTime: str
+    performTime: str
+    tags: tuple
+    recipeCategory: tuple
+    recipeIngredient: tuple = None
+    recipeInstructions: tuple = None
+    notes: tuple = None
+
+internedValues = {}
+
+def internValue(valueClass, *fields):
+    # setdefault keeps this safe from the fetch threads
+    return internedValues.setdefault((valueClass, fields), valueClass(*fields))
+
+def normalizeRecipe(apiData):
+    recipe = Recipe(id=apiData.get("id"),
+                    slug=sys.intern(apiData.get("slug")),
+                    name=apiData.get("name"),
+                    description=apiData.get("description", ""),
+                    image=apiData.get("image"),
+                    totalTime=apiData.get("totalTime", ""),
+                    prepTime=apiData.get("prepTime", ""),
+                    performTime=apiData.get("performTime", ""),
+                    tags=tuple(internValue(Organizer, tag.get("slug"), tag.get("name")) for tag in apiData.get("tags") or []),
+                    recipeCategory=tuple(internValue(Organizer, category.get("slug"), category.get("name")) for category in apiData.get("recipeCategory") or []))
+    if "recipeIngredient" in apiData:
+        recipe.recipeIngredient = tuple(normalizeIngredient(ingredient) for ingredient in apiData.get("recipeIngredient") or [])
+        recipe.recipeInstructions = tuple(Step(step.get("title", ""), step.get("text", "")) for step in apiData.get("recipeInstructions") or [])
+        recipe.notes = tuple(Note(note.get("title", ""), note.get("text", "")) for note in apiData.get("notes") or [])
+    return recipe
+
+def normalizeIngredient(apiIngredient):
+    unit = apiIngredient.get("unit")
+    food = apiIngredient.get("food")
+    return Ingredient(title=apiIngredient.get("title", ""),
+                      quantity=apiIngredient.get("quantity"),
+                      unit=internValue(Unit, unit.get("name")) if unit else None,
+                      food=internValue(Food, food.get("name")) if food else None,
+                      note=apiIngredient.get("note", ""))
+
+def recipeToStoreEntry(recipe):
+    # Flat lists rather than dicts keep recipeCache.json small
+    return [recipe.id, recipe.slug, recipe.name, recipe.description, recipe.image,
+            recipe.totalTime, recipe.prepTime, recipe.performTime,
+            [[tag.slug, tag.name] for tag in recipe.tags],
+            [[category.slug, category.name] for category in recipe.recipeCategory],
+            [[ingredient.title, ingredient.quantity,
+              ingredient.unit.name if ingredient.unit else None,
+              ingredient.food.name if ingredient.food else None,
+              ingredient.note] for ingredient in recipe.recipeIngredient],
+            [[step.title, step.text] for step in recipe.recipeInstructions],
+            [[note.title, note.text] for note in recipe.notes]]
+
+def recipeFromStoreEntry(entry):
+    recipeId, slug, name, description, image, totalTime, prepTime, performTime, tags, categories, ingredients, steps, notes = entry
+    return Recipe(id=recipeId,
+                  slug=sys.intern(slug),
+                  name=name,
+                  description=description,
+                  image=image,
+                  totalTime=totalTime,
+                  prepTime=prepTime,
+                  performTime=performTime,
+                  tags=tuple(internValue(Organizer, *tag) for tag in tags),
+                  recipeCategory=tuple(internValue(Organizer, *category) for category in categories),
+                  recipeIngredient=tuple(Ingredient(title, quantity,
+                                                    internValue(Unit, unitName) if unitName is not None else None,
+                                                    internValue(Food, foodName) if foodName is not None else None,
+                                                    note) for title, quantity, unitName, foodName, note in ingredients),
+                  recipeInstructions=tuple(Step(*step) for step in steps),
+                  notes=tuple(Note(*note) for note in notes))
 
 
 # RECIPE DATA ============================================================================
@@ -110,20 +271,10 @@ def getRecipeData(recipeSlug):
     return globalRecipeCache.get("items")[recipeSlug]
 
 def getRecipeName(recipeSlug):
-    return globalRecipeCache.get("items")[recipeSlug]["name"]
+    return globalRecipeCache.get("items")[recipeSlug].name
 
 def getRecipeNumber(recipeSlug):
-    return globalRecipeCache.get("items")[recipeSlug]["number"]
-
-def setRecipeNumber(recipeSlug, number):
-    globalRecipeCache.get("items")[recipeSlug]["number"] = number
-    return
-
-def dumpGlobalRecipeData():
-    recipeCacheFile = open("recipeCache.json", "w")
-    recipeCacheFile.write(json.dumps(globalRecipeCache))
-    recipeCacheFile.close()
-    return
+    return globalRecipeLocations[recipeSlug][1]
 
 def dumpRecipeData(slug, data):
     file = open(slug+".json","w")
@@ -133,23 +284,441 @@ def dumpRecipeData(slug, data):
 
 def fetchRecipeData(recipeSlug):
     url = "{}/api/recipes/{}".format(MEALIE_URL,recipeSlug)
-    response = requests.get(url, headers=authHeader)
+    with timedStage("fetch", recipeSlug):
+        response = getFromMealie(url)
+    countMetric("fetchBytes", len(response.content))
+    countMetric("fetchStatus{}".format(response.status_code))
+    if response.status_code != 200:
+        sys.exit("Mealie answered {} {} for recipe {}".format(response.status_code, response.reason, recipeSlug))
     fullRecipeData = response.json()
     #dumpRecipeData(recipeSlug, fullRecipeData)
-    fullRecipeData["imageUrl"] = "{}/api/media/recipes/{}/images/min-original.webp".format(MEALIE_URL,fullRecipeData.get("id"))
-    return fullRecipeData
+    return normalizeRecipe(fullRecipeData)
+
+def getRecipeImageUrl(recipeData):
+    # Mealie changes "image" whenever a new picture is uploaded; putting it in the URL
+    # means a new picture also changes the page's render cache key
+    return "{}/api/media/recipes/{}/images/min-original.webp?version={}".format(MEALIE_URL,recipeData.id,recipeData.image)
+
+def streamInOrder(function, items):
+    # Runs function over items on a thread pool with a bounded number of calls in flight,
+    # yielding results in the order the items came in. items can itself be a stream, so
+    # stages chain: each one pulls from the previous only as fast as it is consumed.
+    inFlightLimit = args.fetchWorkers * 2
+    with ThreadPoolExecutor(max_workers=args.fetchWorkers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= inFlightLimit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def listRecipeSummaries():
+    # Metadata pass: the listing alone has the names, tags and categories needed to
+    # number the book. Returns the matching summaries in listing order and the updated
+    # stamp of everything listed.
+    summaries = {}
+    listedStamps = {}
+    for recipe in iterRecipeListing(planRecipeQuery()):
+        recipeSlug = recipe.get("slug")
+        listedStamps[recipeSlug] = getRecipeUpdatedStamp(recipe)
+        recipeSummary = normalizeRecipe(recipe)
+        if recipeMatchesFilters(recipeSummary):
+            summaries[recipeSlug] = recipeSummary
+    return summaries, listedStamps
+
+def streamFullRecipes(recipeSlugs, store, listedStamps):
+    # Yields (slug, full recipe) in the order given, taking fresh recipes from the store
+    # and fetching the rest. Fetched recipes are put back into the store as they arrive.
+    def loadFullRecipe(recipeSlug):
+        if args.offline or recipeIsFreshInStore(store, recipeSlug, listedStamps[recipeSlug]):
+            return store["items"][recipeSlug], False
+        return fetchRecipeData(recipeSlug), True
+
+    staleCount = 0
+    if not args.offline:
+        staleCount = sum(1 for recipeSlug in recipeSlugs if not recipeIsFreshInStore(store, recipeSlug, listedStamps[recipeSlug]))
+    print("{} recipes up to date in {}, {} to fetch".format(len(recipeSlugs) - staleCount, args.from_backup or RECIPE_STORE_FILENAME, staleCount))
+
+    fetchedCount = 0
+    for recipeSlug, (fullRecipeData, wasFetched) in zip(recipeSlugs, streamInOrder(loadFullRecipe, recipeSlugs)):
+        if wasFetched:
+            store["items"][recipeSlug] = fullRecipeData
+            store["updated"][recipeSlug] = listedStamps[recipeSlug]
+            fetchedCount += 1
+            print("Fetched {}/{} recipes".format(fetchedCount, staleCount), end="\r" if fetchedCount < staleCount else "\n")
+        yield recipeSlug, fullRecipeData
 
 def fetchAllRecipesWithData():
-    url = "{}/api/recipes?perPage=-1&loadFood=false".format(MEALIE_URL)
-    response = requests.get(url, headers=authHeader)
-    listData = response.json()
+    store = loadRecipeStore()
+    summaries, listedStamps = listRecipeSummaries()
+    evictDeletedRecipes(store, listedStamps)
+
+    dictConvert = {}
+    for recipeSlug, fullRecipeData in streamFullRecipes(list(summaries), store, listedStamps):
+        dictConvert[recipeSlug] = fullRecipeData
+    saveRecipeStore(store)
+    return {"items": dictConvert}
+
+def loadAllRecipesWithData():
+    if args.offline:
+        return loadRecipesFromStore()
+    return fetchAllRecipesWithData()
+
+
+# RECIPE STORE ===========================================================================
+# recipeCache.json keeps every recipe seen in the Mealie listing, keyed by slug, along
+# with the updated stamp it was listed with. Only new or changed recipes get refetched.
+RECIPE_STORE_FILENAME = "recipeCache.json"
+RECIPE_STORE_FORMAT = 2
+
+def loadRecipeStore():
+    if not os.path.exists(RECIPE_STORE_FILENAME):
+        return {"items": {}, "updated": {}}
+    with open(RECIPE_STORE_FILENAME) as f:
+        store = json.load(f)
+    # Caches from before the compact format hold raw API responses, so everything refetches
+    if store.get("format") != RECIPE_STORE_FORMAT:
+        return {"items": {}, "updated": {}}
+    items = {recipeSlug: recipeFromStoreEntry(entry) for recipeSlug, entry in store["items"].items()}
+    return {"items": items, "updated": store["updated"]}
+
+def saveRecipeStore(store):
+    tempFilename = RECIPE_STORE_FILENAME + ".tmp"
+    items = {recipeSlug: recipeToStoreEntry(recipe) for recipeSlug, recipe in store["items"].items()}
+    with open(tempFilename, "w") as f:
+        json.dump({"format": RECIPE_STORE_FORMAT, "items": items, "updated": store["updated"]}, f, separators=(",", ":"))
+    os.replace(tempFilename, RECIPE_STORE_FILENAME)
+    return
+
+def getRecipeUpdatedStamp(recipeObject):
+    return recipeObject.get("updatedAt") or recipeObject.get("dateUpdated")
+
+def recipeIsFreshInStore(store, recipeSlug, updatedStamp):
+    if updatedStamp is None or recipeSlug not in store["items"]:
+        return False
+    return store["updated"].get(recipeSlug) == updatedStamp
+
+def evictDeletedRecipes(store, listedStamps):
+    # The listing only covers recipes matching the server-side query, so only stored
+    # recipes that query would have returned can be known to be gone
+    for recipeSlug in list(store["items"]):
+        if recipeSlug not in listedStamps and recipeMatchesListingQuery(store["items"][recipeSlug]):
+            del store["items"][recipeSlug]
+            store["updated"].pop(recipeSlug, None)
+    return
+
+def loadRecipesFromStore():
+    store = loadStoreForOffline()
     dictConvert = {}
-    for recipe in listData.get("items"):
-        if not shouldRemoveTaggedRecipe(recipe) and recipeHasDesiredCategories(recipe):
-            fullRecipeData = fetchRecipeData(recipe.get("slug"))
-            dictConvert[fullRecipeData["slug"]] = fullRecipeData
-    listData["items"] = dictConvert
-    return listData
+    for recipeSlug, fullRecipeData in store["items"].items():
+        if recipeMatchesFilters(fullRecipeData):
+            dictConvert[recipeSlug] = fullRecipeData
+    return {"items": dictConvert}
+
+def loadStoreForOffline():
+    if args.from_backup:
+        return loadBackupStore(args.from_backup)
+    if not os.path.exists(RECIPE_STORE_FILENAME):
+        sys.exit("No {} found, run once without --offline to build it".format(RECIPE_STORE_FILENAME))
+    return loadRecipeStore()
+
+
+# RECIPE BACKUP ==========================================================================
+# --fromBackup reads a Mealie backup zip instead of the API. Its database.json holds each
+# table as a list of rows; recipes are joined back up with their ingredients, steps,
+# notes, tags and categories under the API's field names and normalized like a fetched
+# recipe. Images come from the data/recipes/{id}/images/ members, so nothing is sent to
+# Mealie and the rest of the run treats the backup like --offline.
+BACKUP_DATABASE_FILENAME = "database.json"
+BACKUP_IMAGE_PATTERN = re.compile(r"(?:^|/)recipes/([^/]+)/images/([^/]+)$")
+# min-original is the one the API serves, original.webp the upload itself
+BACKUP_IMAGE_NAMES = ["min-original.webp", "original.webp"]
+
+def getBackupId(value):
+    # The database may write ids without dashes; the API and image folders use them
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return str(value)
+
+def indexBackupRows(rows, fields):
+    return {getBackupId(row.get("id")): {field: row.get(field) for field in fields} for row in rows}
+
+def groupBackupRows(rows, key):
+    grouped = collections.defaultdict(list)
+    for row in rows:
+        grouped[getBackupId(row.get(key))].append(row)
+    return grouped
+
+def lookupBackupRow(rowsById, rowId):
+    return rowsById.get(getBackupId(rowId)) if rowId is not None else None
+
+@functools.lru_cache(maxsize=None)
+def openBackup(backupFilename):
+    # Stays open for the run; zipfile lets the image threads read members side by side
+    try:
+        archive = zipfile.ZipFile(backupFilename)
+    except (OSError, zipfile.BadZipFile) as e:
+        sys.exit("Can't read backup {}: {}".format(backupFilename, e))
+    memberNames = archive.namelist()
+    databaseMembers = [name for name in memberNames if name.rsplit("/", 1)[-1] == BACKUP_DATABASE_FILENAME]
+    if not databaseMembers:
+        sys.exit("No {} found in {}".format(BACKUP_DATABASE_FILENAME, backupFilename))
+    imageMembers = {}
+    for name in memberNames:
+        match = BACKUP_IMAGE_PATTERN.search(name)
+        if match:
+            imageMembers[(getBackupId(match.group(1)), match.group(2))] = name
+    return archive, min(databaseMembers, key=len), imageMembers
+
+def iterBackupRecipes(tables):
+    # Every child table is grouped by recipe in one pass, then each recipe is put
+    # together in turn
+    categories = indexBackupRows(tables.get("categories", []), ["slug", "name"])
+    tags = indexBackupRows(tables.get("tags", []), ["slug", "name"])
+    units = indexBackupRows(tables.get("ingredient_units", []), ["name"])
+    foods = indexBackupRows(tables.get("ingredient_foods", []), ["name"])
+    categoryLinks = groupBackupRows(tables.get("recipes_to_categories", []), "recipe_id")
+    tagLinks = groupBackupRows(tables.get("recipes_to_tags", []), "recipe_id")
+    ingredients = groupBackupRows(tables.get("recipes_ingredients", []), "recipe_id")
+    steps = groupBackupRows(tables.get("recipe_instructions", []), "recipe_id")
+    notes = groupBackupRows(tables.get("notes", []), "recipe_id")
+
+    # Backup rows hold explicit nulls where the API sends "", so text fields are
+    # filled in here rather than trusting .get's default
+    for row in tables.get("recipes", []):
+        recipeId = getBackupId(row.get("id"))
+        yield {
+            "id": recipeId,
+            "slug": row.get("slug"),
+            "name": row.get("name"),
+            "description": row.get("description") or "",
+            "image": row.get("image"),
+            "totalTime": row.get("total_time"),
+            "prepTime": row.get("prep_time"),
+            "performTime": row.get("perform_time"),
+            "updatedAt": row.get("updated_at") or row.get("date_updated"),
+            "recipeCategory": [categories[getBackupId(link.get("category_id"))] for link in categoryLinks[recipeId]
+                               if getBackupId(link.get("category_id")) in categories],
+            "tags": [tags[getBackupId(link.get("tag_id"))] for link in tagLinks[recipeId]
+                     if getBackupId(link.get("tag_id")) in tags],
+            "recipeIngredient": [{"title": ingredient.get("title") or "",
+                                  "quantity": ingredient.get("quantity"),
+                                  "unit": lookupBackupRow(units, ingredient.get("unit_id")),
+                                  "food": lookupBackupRow(foods, ingredient.get("food_id")),
+                                  "note": ingredient.get("note") or ""}
+                                 for ingredient in sorted(ingredients[recipeId], key=lambda ingredient: ingredient.get("position") or 0)],
+            "recipeInstructions": [{"title": step.get("title") or "", "text": step.get("text") or ""}
+                                   for step in sorted(steps[recipeId], key=lambda step: step.get("position") or 0)],
+            "notes": [{"title": note.get("title") or "", "text": note.get("text") or ""} for note in notes[recipeId]],
+        }
+
+@functools.lru_cache(maxsize=None)
+def loadBackupStore(backupFilename):
+    # Read once per run, however many books or jobs are built from it
+    archive, databaseMember, imageMembers = openBackup(backupFilename)
+    store = {"items": {}, "updated": {}}
+    with timedStage("backupRead"):
+        with archive.open(databaseMember) as f:
+            tables = json.load(f)
+        for apiData in iterBackupRecipes(tables):
+            recipeSlug = apiData.get("slug")
+            store["items"][recipeSlug] = normalizeRecipe(apiData)
+            store["updated"][recipeSlug] = getRecipeUpdatedStamp(apiData)
+    print("{} recipes and {} images in {}".format(len(store["items"]), len(imageMembers), backupFilename))
+    return store
+
+def readBackupImage(recipeData):
+    archive, databaseMember, imageMembers = openBackup(args.from_backup)
+    for imageName in BACKUP_IMAGE_NAMES:
+        memberName = imageMembers.get((recipeData.id, imageName))
+        if memberName is not None:
+            with timedStage("imageRead", recipeData.slug):
+                imageContent = archive.read(memberName)
+            countMetric("imageReadBytes", len(imageContent))
+            return imageContent
+    return None
+
+
+# RECIPE LISTING =========================================================================
+# --categories and --tag are sent to Mealie as listing filters, and the listing is read a
+# page at a time. Mealie has no "without tag" filter, so --removeTags stays client side.
+# Every listed recipe is still checked against all filters in case the server ignored
+# one of them.
+LISTING_PAGE_SIZE = 100
+
+def planRecipeQuery():
+    params = {"perPage": LISTING_PAGE_SIZE, "loadFood": "false"}
+    if args.categories:
+        params["categories"] = args.categories
+        params["requireAllCategories"] = "false"
+    if args.tag:
+        params["tags"] = [args.tag]
+    return params
+
+def iterRecipeListing(params):
+    url = "{}/api/recipes".format(MEALIE_URL)
+    page = 1
+    while True:
+        with timedStage("listing"):
+            response = getFromMealie(url, params=dict(params, page=page))
+        countMetric("listingBytes", len(response.content))
+        if response.status_code != 200:
+            sys.exit("Mealie answered {} {} for the recipe listing".format(response.status_code, response.reason))
+        listData = response.json()
+        for recipe in listData.get("items"):
+            yield recipe
+        # Older servers that don't page send everything back without total_pages
+        if not listData.get("items") or page >= listData.get("total_pages", page):
+            return
+        page += 1
+
+def recipeMatchesListingQuery(recipeObject):
+    if args.tag and not recipeHasTag(recipeObject, args.tag):
+        return False
+    return recipeHasDesiredCategories(recipeObject)
+
+def recipeMatchesFilters(recipeObject):
+    return recipeMatchesListingQuery(recipeObject) and not shouldRemoveTaggedRecipe(recipeObject)
+
+
+# RECIPE IMAGES ==========================================================================
+# Each recipe image is downloaded once into .image_cache/, keyed by recipe id and
+# Mealie's image key, then cropped and downscaled to what the page actually prints.
+IMAGE_CACHE_DIR = ".image_cache"
+# .main-image-wrapper is 30% of the page wide and 15em tall, and the img is cropped
+# square (aspect-ratio 1, object-fit cover), so it prints about 2.5in on a side
+RECIPE_IMAGE_SIZE_INCHES = 2.5
+
+def getRecipeImageFilenames(recipeData):
+    baseFilename = os.path.join(IMAGE_CACHE_DIR, "{}-{}".format(recipeData.id, recipeData.image))
+    return baseFilename + ".webp", "{}-{}dpi.jpg".format(baseFilename, args.imageDpi)
+
+def cacheRecipeImage(recipeData):
+    originalFilename, resizedFilename = getRecipeImageFilenames(recipeData)
+    if not os.path.exists(originalFilename):
+        if args.from_backup and recipeData.image:
+            imageContent = readBackupImage(recipeData)
+        elif args.offline or not recipeData.image:
+            return None
+        else:
+            imageContent = fetchRecipeImage(recipeData)
+        if imageContent is None:
+            return None
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        with open(originalFilename + ".tmp", "wb") as f:
+            f.write(imageContent)
+        os.replace(originalFilename + ".tmp", originalFilename)
+
+    if not os.path.exists(resizedFilename):
+        from PIL import Image, ImageOps
+        with timedStage("imageResize", recipeData.slug):
+            try:
+                with Image.open(originalFilename) as image:
+                    # Never upscale; a small source is only cropped square
+                    sizePx = min(round(RECIPE_IMAGE_SIZE_INCHES * args.imageDpi), *image.size)
+                    resizedImage = ImageOps.fit(image.convert("RGB"), (sizePx, sizePx), Image.LANCZOS)
+                resizedImage.save(resizedFilename + ".tmp", "JPEG", quality=85, optimize=True)
+            except (OSError, Image.UnidentifiedImageError) as error:
+                # A truncated or non-image download would fail the same way on every run,
+                # so drop it and let the next online run fetch it again
+                print("Skipping the image for {}: {}".format(recipeData.slug, error))
+                countMetric("imageDecodeErrors")
+                for filename in (originalFilename, resizedFilename + ".tmp"):
+                    if os.path.exists(filename):
+                        os.remove(filename)
+                return None
+            os.replace(resizedFilename + ".tmp", resizedFilename)
+
+    return os.path.getsize(originalFilename), os.path.getsize(resizedFilename)
+
+def fetchRecipeImage(recipeData):
+    import requests
+    # A picture that can't be fetched leaves the page without one rather than failing the build
+    try:
+        with timedStage("imageFetch", recipeData.slug):
+            response = getMealieSession().get(getRecipeImageUrl(recipeData), timeout=MEALIE_TIMEOUT)
+    except requests.RequestException:
+        countMetric("imageFetchFailed")
+        return None
+    countMetric("imageFetchStatus{}".format(response.status_code))
+    if response.status_code != 200:
+        return None
+    countMetric("imageFetchBytes", len(response.content))
+    return response.content
+
+def prepareRecipeImage(recipeData):
+    # Kept out of the recipe data itself so image paths never end up in the recipe store
+    if args.imageDpi == 0:
+        return None
+    imageSizes = cacheRecipeImage(recipeData)
+    if imageSizes is None:
+        globalRecipeImages[recipeData.slug] = None
+    else:
+        globalRecipeImages[recipeData.slug] = pathlib.Path(getRecipeImageFilenames(recipeData)[1]).resolve().as_uri()
+    return imageSizes
+
+def prepareRecipeImages(recipes):
+    with ThreadPoolExecutor(max_workers=args.fetchWorkers) as executor:
+        reportImageSavings(list(executor.map(prepareRecipeImage, recipes)))
+    return
+
+def reportImageSavings(imageSizesList):
+    if args.imageDpi == 0:
+        return
+    originalBytes = sum(imageSizes[0] for imageSizes in imageSizesList if imageSizes)
+    embeddedBytes = sum(imageSizes[1] for imageSizes in imageSizesList if imageSizes)
+    print("Recipe images: {:.1f} MB original, {:.1f} MB embedded at {} dpi ({:.1f} MB saved)".format(
+        originalBytes / 1e6, embeddedBytes / 1e6, args.imageDpi, (originalBytes - embeddedBytes) / 1e6))
+    return
+
+def getRecipeImageSource(recipeData):
+    if recipeData.slug in globalRecipeImages:
+        return globalRecipeImages[recipeData.slug]
+    return getRecipeImageUrl(recipeData)
+
+
+# MEALIE SESSION =========================================================================
+# Seconds to connect and to wait between bytes; a stalled server fails the request
+# instead of holding a fetch thread forever
+MEALIE_TIMEOUT = (10, 60)
+mealieSession = None
+mealieSessionLock = threading.Lock()
+
+def buildMealieSession(maxConnections):
+    # One keep-alive pool shared by every fetch thread; 429s and 5xx are retried
+    # with exponential backoff (honouring Retry-After) before giving up.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retries = Retry(total=5,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxConnections, max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(authHeader)
+    return session
+
+def getMealieSession():
+    # Built on the first request, so runs that never reach Mealie never set it up
+    global mealieSession
+    with mealieSessionLock:
+        if mealieSession is None:
+            mealieSession = buildMealieSession(args.fetchWorkers)
+    return mealieSession
+
+def getFromMealie(url, params=None):
+    # Retries are spent by the time an error gets here, so it ends the run like any
+    # other unusable input
+    import requests
+    try:
+        return getMealieSession().get(url, params=params, timeout=MEALIE_TIMEOUT)
+    except requests.RequestException as error:
+        sys.exit("Can't get {} from Mealie: {}".format(url, error))
 
 
 # FILTERING GLOBAL DATA =========================================================================
@@ -157,14 +726,14 @@ def shouldRemoveTaggedRecipe(recipeObject):
     if not args.removeTags:
         return False
     else:
-        for recipeTag in recipeObject.get("tags"):
-            if recipeTag.get("slug") in args.removeTags:
+        for recipeTag in recipeObject.tags:
+            if recipeTag.slug in args.removeTags:
                 return True 
     return False
 
 def recipeHasCategory(recipeObject, category):
-    for recipeCategory in recipeObject.get("recipeCategory"):
-        if recipeCategory.get("slug") == category:
+    for recipeCategory in recipeObject.recipeCategory:
+        if recipeCategory.slug == category:
             return True
     return False
 
@@ -181,53 +750,51 @@ def recipeHasDesiredCategories(recipeObject):
 
 
 # FILTERING ==============================================================================
-def getRecipeSlugsWithTag(tagSlug):
-    recipeSlugList = []
+def buildRecipeIndex():
+    # One pass over every recipe builds slug lists for each tag, category and food, so the
+    # manifest builders don't rescan the whole library for every lookup. Like the old
+    # lookups, categories and foods only list recipes that have --tag (if given).
+    index = {"tags": {}, "categories": {}, "foods": {}}
     for recipe in globalRecipeCache.get("items"):
         recipeObject = globalRecipeCache.get("items")[recipe]
-        if recipeHasTag(recipeObject, tagSlug):
-            recipeSlugList.append(recipeObject.get("slug"))
-    return recipeSlugList
+        recipeSlug = recipeObject.slug
+        for tag in recipeObject.tags:
+            addToRecipeIndex(index["tags"], tag.slug, recipeSlug)
+        if args.tag and not recipeHasTag(recipeObject, args.tag):
+            continue
+        for category in recipeObject.recipeCategory:
+            addToRecipeIndex(index["categories"], category.slug, recipeSlug)
+        # Listing summaries have no ingredients; foods are indexed once full recipes are in
+        for ingredient in recipeObject.recipeIngredient or ():
+            if ingredient.food:
+                addToRecipeIndex(index["foods"], ingredient.food.name, recipeSlug)
+    return index
+
+def addToRecipeIndex(indexEntries, key, recipeSlug):
+    recipeSlugList = indexEntries.setdefault(key, [])
+    # Recipes are indexed one at a time, so a repeated food only needs checking against the tail
+    if not recipeSlugList or recipeSlugList[-1] != recipeSlug:
+        recipeSlugList.append(recipeSlug)
+    return
+
+def getRecipeSlugsWithTag(tagSlug):
+    return globalRecipeIndex["tags"].get(tagSlug, [])
 
 def getRecipeSlugsWithCategory(categorySlug):
-    recipeSlugList = []
-    for recipe in globalRecipeCache.get("items"):
-        recipeObject = globalRecipeCache.get("items")[recipe]
-        if recipeHasCategory(recipeObject, categorySlug):
-            if args.tag:
-                if recipeHasTag(recipeObject, args.tag):
-                    recipeSlugList.append(recipeObject.get("slug"))
-            else:
-                recipeSlugList.append(recipeObject.get("slug"))
-    return recipeSlugList
+    return globalRecipeIndex["categories"].get(categorySlug, [])
 
 def getRecipeSlugsWithIngredient(ingredientName):
-    recipeSlugList = []
-    for recipe in globalRecipeCache.get("items"):
-        recipeObject = globalRecipeCache.get("items")[recipe]
-        if recipeHasIngredient(recipeObject, ingredientName):
-            if args.tag:
-                if recipeHasTag(recipeObject, args.tag):
-                    recipeSlugList.append(recipeObject.get("slug"))
-            else:
-                recipeSlugList.append(recipeObject.get("slug"))
-    return recipeSlugList
+    return globalRecipeIndex["foods"].get(ingredientName, [])
 
 def recipeHasCategory(recipeObject, categorySlug):
-    for category in recipeObject.get("recipeCategory"):
-        if category.get("slug") == categorySlug:
+    for category in recipeObject.recipeCategory:
+        if category.slug == categorySlug:
             return True
     return False
 
 def recipeHasTag(recipeObject, tagSlug):
-    for tag in recipeObject.get("tags"):
-        if tag.get("slug") == tagSlug:
-            return True
-    return False
-
-def recipeHasIngredient(recipeObject, ingredientName):
-    for ingredient in recipeObject.get("recipeIngredient"):
-        if ingredient.get("food") and ingredient.get("food").get("name") == ingredientName:
+    for tag in recipeObject.tags:
+        if tag.slug == tagSlug:
             return True
     return False
 
@@ -235,12 +802,13 @@ def recipeHasIngredient(recipeObject, ingredientName):
 # RENDERING HTML =========================================================================
 def getRecipeAndRenderHTML(recipeSlug, number):
     recipeData = getRecipeData(recipeSlug)
-    sourceHtml = recipeTemplate.render(data=recipeData,image=recipeData.get("imageUrl"), recipeNumber=number)
+    with timedStage("renderHtml", recipeSlug):
+        sourceHtml = getPageTemplate("recipe_page_template.html").render(data=recipeData,image=getRecipeImageSource(recipeData),ingredientLines=globalIngredientLines[recipeSlug], recipeNumber=number)
     return sourceHtml
 
 def renderSectionHTML(categorySlug):
     title = getCategoryName(categorySlug)
-    sourceHtml = sectionTemplate.render(title=title,
+    sourceHtml = getPageTemplate("section_template.html").render(title=title,
                                         manifest=globalCategoryManifest,
                                         category=categorySlug)
     return sourceHtml
@@ -248,216 +816,612 @@ def renderSectionHTML(categorySlug):
 def renderTitleHTML():
     title = TITLE if TITLE != None else "Cookbook"
     subtitle = SUBTITLE if SUBTITLE != None else ""
-    sourceHtml = titleTemplate.render(title=title,subtitle=subtitle)
+    sourceHtml = getPageTemplate("title_template.html").render(title=title,subtitle=subtitle)
     return sourceHtml
 
 def renderSpiceUsesHTML(page):
-    return spiceUsesTemplate.render(pageNumber=page)
+    return getPageTemplate("spice_uses_template.html").render(pageNumber=page)
 
 def renderSubstitutionsHTML(page):
-    return substitutionsTemplate.render(pageNumber=page)
+    return getPageTemplate("substitutions_template.html").render(pageNumber=page)
 
 def renderUnitConversionsHTML(page):
-    return unitConversionTemplate.render(pageNumber=page)
+    return getPageTemplate("unit_conversions_template.html").render(pageNumber=page)
 
 def renderSousVideHTML(page):
-    return sousVideTemplate.render(pageNumber=page)
+    return getPageTemplate("sous_vide_template.html").render(pageNumber=page)
 
 def renderDedicationHTML(dedicationText):
-    sourceHtml = dedicationTemplate.render(dedication=dedicationText)
+    sourceHtml = getPageTemplate("dedication_template.html").render(dedication=dedicationText)
     return sourceHtml
 
 def renderToCHTML():
-    sourceHtml = tocTemplate.render(title="Contents", categoryManifest=globalCategoryManifest,staticPageCatalog=globalStaticCatalog)
+    sourceHtml = getPageTemplate("toc_template.html").render(title="Contents", categoryManifest=globalCategoryManifest,staticPageCatalog=globalStaticCatalog)
     return sourceHtml
 
 def renderIndexHTML():
     sortedManifestKeys = sorted(globalIndexCatalog)
-    sourceHtml = indexTemplate.render(title="Index", 
+    sourceHtml = getPageTemplate("index_template.html").render(title="Index", 
                                         indexCatalog=globalIndexCatalog,
                                         tagManifest=globalTagManifest,
                                         ingredientManifest=globalIngredientManifest,
                                         sortedManifestKeys=sortedManifestKeys)
     return sourceHtml
 
-def saveHtml(htmlContent, outputHTMLFilename):
-    htmlFile = open(outputHTMLFilename, "w")
-    htmlFile.write(htmlContent)
-    htmlFile.close()
+def saveArtifact(artifactName, content):
+    artifactFilename = os.path.join(OUTPUT_DIR, artifactName)
+    os.makedirs(os.path.dirname(artifactFilename), exist_ok=True)
+    mode = "wb" if isinstance(content, bytes) else "w"
+    with open(artifactFilename, mode) as artifactFile:
+        artifactFile.write(content)
+    return
+
+
+# TEMPLATES ==============================================================================
+# One Jinja environment for every template, with the helpers registered on it once.
+# Compiled templates are kept in .template_cache/ and reused until the template source
+# changes, so a run only compiles templates that were edited since the last one. The
+# environment and each template are only loaded the first time a page needs them.
+TEMPLATES_DIR = "templates"
+TEMPLATE_CACHE_DIR = ".template_cache"
+
+TEMPLATE_HELPERS = {
+    "convertDecimalToFractionString": convertDecimalToFractionString,
+    "getIngredientNoteAppend": getIngredientNoteAppend,
+    "pluralizeUnit": pluralizeUnit,
+    "pluralizeIngredient": pluralizeIngredient,
+    "getRecipeName": getRecipeName,
+    "getRecipeNumber": getRecipeNumber,
+    "getCategoryName": getCategoryName,
+}
+
+templateEnv = None
+pageTemplates = {}
+
+def buildTemplateEnvironment():
+    import jinja2
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    templateEnv = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=TEMPLATES_DIR),
+                                     bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR))
+    templateEnv.globals.update(TEMPLATE_HELPERS)
+    return templateEnv
+
+def getTemplateEnvironment():
+    global templateEnv
+    if templateEnv is None:
+        templateEnv = buildTemplateEnvironment()
+    return templateEnv
+
+def getPageTemplate(templateFilename):
+    # The environment notices edited templates on its own, but templates kept here stay
+    # the version they were loaded with, so --watch clears them after an edit
+    if templateFilename not in pageTemplates:
+        pageTemplates[templateFilename] = getTemplateEnvironment().get_template(templateFilename)
+    return pageTemplates[templateFilename]
+
+def precompileTemplates():
+    templateEnv = getTemplateEnvironment()
+    templateNames = templateEnv.list_templates(filter_func=lambda templateName: templateName.endswith(".html"))
+    for templateName in templateNames:
+        templateEnv.get_template(templateName)
+    print("Compiled {} templates into {}".format(len(templateNames), TEMPLATE_CACHE_DIR))
     return
 
 
 # GENERATE PDF ===========================================================================
-def convertHtmlToPdf(htmlFileName, stylesFilename, outputPDFFilename):
-    font_config = FontConfiguration()
-    htmlFile = open(htmlFileName, "r")
-    html = HTML(string=htmlFile.read(),base_url='base_url')
-    htmlFile.close()
-    css = CSS(stylesFilename, font_config=font_config)
-    html.write_pdf(outputPDFFilename, stylesheets=[css], font_config=font_config)
+# Pages are passed around in memory as HTML strings and PDF bytes, keyed by a page name
+# like "toc" or "breakfast/pancakes". --keepArtifacts also writes them under output/.
+OUTPUT_DIR = "output"
+
+# Each template stylesheet is parsed, and its @font-face fonts loaded, once per process
+# (the --jobs workers each keep their own) and then reused for every page
+sharedFontConfig = None
+stylesheetRegistry = {}
+
+def getStylesheet(stylesFilename):
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+    global sharedFontConfig
+    if sharedFontConfig is None:
+        sharedFontConfig = FontConfiguration()
+    if stylesFilename not in stylesheetRegistry:
+        stylesheetRegistry[stylesFilename] = CSS(stylesFilename, font_config=sharedFontConfig)
+    return stylesheetRegistry[stylesFilename]
+
+def convertHtmlToPdf(htmlContent, stylesFilename):
+    # Layout and PDF writing are timed separately and sent back with the PDF, since
+    # under --jobs this runs in a worker process that can't see runMetrics
+    from weasyprint import HTML
+    html = HTML(string=htmlContent,base_url='base_url')
+    css = getStylesheet(stylesFilename)
+    startTime = time.perf_counter()
+    document = html.render(stylesheets=[css], font_config=sharedFontConfig)
+    layoutTime = time.perf_counter()
+    pdfContent = document.write_pdf()
+    timings = {"layout": layoutTime - startTime, "writePdf": time.perf_counter() - layoutTime, "pages": len(document.pages)}
+    return pdfContent, timings
+
+def startRenderPool(jobs):
+    # spawn rather than fork: workers only need convertHtmlToPdf and the module
+    # imports, and the fetch threads/sockets shouldn't be copied into them
+    if jobs > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+    return None
+
+def queuePdfConversion(pageName, htmlContent, stylesFilename, recipeSlug=None):
+    if args.single_pass:
+        if args.keep_artifacts:
+            saveArtifact(pageName + ".html", htmlContent)
+        singlePassPages[pageName] = (htmlContent, stylesFilename)
+        return
+    # Under --watch and --editions most pages come back unchanged and are already in memory
+    pageKey = getRenderCacheKey(htmlContent, stylesFilename)
+    if renderedPageKeys.get(pageName) == pageKey:
+        return
+    cacheKey = None if args.no_cache else pageKey
+    if args.keep_artifacts:
+        saveArtifact(pageName + ".html", htmlContent)
+    # A page rendered earlier in the run is shared whatever it was called then, so
+    # each distinct page is rendered once across editions and build jobs
+    cachedPdf = renderedPdfs.get(pageKey)
+    if cachedPdf is not None:
+        countMetric("pagesShared")
+    elif cacheKey:
+        cachedPdf = fetchFromRenderCache(cacheKey)
+        countMetric("renderCacheHits" if cachedPdf is not None else "renderCacheMisses")
+    if cachedPdf is not None:
+        storeRenderedPage(pageName, pageKey, None, cachedPdf)
+        if recipeSlug:
+            recordFirstRecipePage()
+    elif renderPool is None:
+        pdfContent, timings = convertHtmlToPdf(htmlContent, stylesFilename)
+        recordConversion(timings, recipeSlug)
+        storeRenderedPage(pageName, pageKey, cacheKey, pdfContent)
+    else:
+        conversion = renderPool.submit(convertHtmlToPdf, htmlContent, stylesFilename)
+        if recipeSlug:
+            conversion.add_done_callback(lambda _: recordFirstRecipePage())
+        pendingPdfConversions.append((pageName, pageKey, cacheKey, recipeSlug, conversion))
+    return
+
+def storeRenderedPage(pageName, pageKey, cacheKey, pdfContent):
+    # The key is only recorded once the PDF is in hand, so a conversion that never
+    # finishes (a failed job or rebuild) can't leave a page marked as up to date
+    renderedPages[pageName] = pdfContent
+    renderedPageKeys[pageName] = pageKey
+    if pageKey is not None:
+        # Moved to the end, so pruneRenderedPdfs drops the longest unused first
+        renderedPdfs.pop(pageKey, None)
+        renderedPdfs[pageKey] = pdfContent
+    storeInRenderCache(cacheKey, pdfContent)
+    if args.keep_artifacts:
+        saveArtifact(pageName + ".pdf", pdfContent)
+    return
+
+def waitForPdfConversions():
+    for pageName, pageKey, cacheKey, recipeSlug, conversion in pendingPdfConversions:
+        pdfContent, timings = conversion.result()
+        recordConversion(timings, recipeSlug)
+        storeRenderedPage(pageName, pageKey, cacheKey, pdfContent)
+    pendingPdfConversions.clear()
+    return
+
+def recordConversion(timings, recipeSlug):
+    countMetric("pagesRendered")
+    countMetric("pdfPages", timings["pages"])
+    recordStageTime("layout", timings["layout"], recipeSlug)
+    recordStageTime("writePdf", timings["writePdf"], recipeSlug)
+    if recipeSlug:
+        recordFirstRecipePage()
+    return
+
+def pruneRenderedPdfs(maxBytes):
+    # --watch and --serve run for a long time, so pages no book uses any more are only
+    # kept up to the render cache's size
+    bookPageKeys = set(renderedPageKeys.values())
+    totalBytes = sum(len(pdfContent) for pdfContent in renderedPdfs.values())
+    for pageKey in list(renderedPdfs):
+        if totalBytes <= maxBytes:
+            break
+        if pageKey not in bookPageKeys:
+            totalBytes -= len(renderedPdfs.pop(pageKey))
+    return
+
+def saveRenderedPages():
+    if not args.keep_artifacts:
+        for pageName in renderedPages:
+            saveArtifact(pageName + ".pdf", renderedPages[pageName])
+    return
+
+
+# RENDER CACHE ===========================================================================
+# Rendered pages are stored by a hash of everything WeasyPrint reads: the page HTML,
+# its stylesheet and the fonts. A page whose number or data changed gets a new key;
+# everything else is copied straight out of the cache.
+RENDER_CACHE_DIR = ".render_cache"
+FONTS_DIR = "fonts"
+
+@functools.lru_cache(maxsize=None)
+def getFileDigest(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def getRenderCacheKey(htmlContent, stylesFilename):
+    digest = hashlib.sha256()
+    digest.update(htmlContent.encode())
+    digest.update(getFileDigest(stylesFilename).encode())
+    for fontFilename in sorted(os.listdir(FONTS_DIR)):
+        digest.update(fontFilename.encode())
+        digest.update(getFileDigest(os.path.join(FONTS_DIR, fontFilename)).encode())
+    return digest.hexdigest()
+
+def fetchFromRenderCache(cacheKey):
+    cachedFilename = os.path.join(RENDER_CACHE_DIR, cacheKey + ".pdf")
+    if not os.path.exists(cachedFilename):
+        return None
+    with open(cachedFilename, "rb") as f:
+        pdfContent = f.read()
+    # mtime doubles as the last-used time for LRU eviction
+    os.utime(cachedFilename)
+    return pdfContent
+
+def storeInRenderCache(cacheKey, pdfContent):
+    if not cacheKey:
+        return
+    if not os.path.exists(RENDER_CACHE_DIR):
+        os.mkdir(RENDER_CACHE_DIR)
+    cachedFilename = os.path.join(RENDER_CACHE_DIR, cacheKey + ".pdf")
+    with open(cachedFilename + ".tmp", "wb") as f:
+        f.write(pdfContent)
+    os.replace(cachedFilename + ".tmp", cachedFilename)
+    return
+
+def pruneRenderCache(maxBytes):
+    if not os.path.exists(RENDER_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(RENDER_CACHE_DIR):
+        entryStat = entry.stat()
+        entries.append((entryStat.st_mtime, entryStat.st_size, entry.path))
+    totalBytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if totalBytes <= maxBytes:
+            break
+        os.remove(path)
+        totalBytes -= size
     return
 
 def generateSectionHeaderPDF(category):
     renderedHTML = renderSectionHTML(category)
-    if not os.path.exists("output/{}".format(category)):
-        os.mkdir("output/{}".format(category))
-    outputPDFFilename = "output//{}.pdf".format(category)
-    outputHTMLFilename = "output//{}.html".format(category)
     stylesFilename = "templates//section_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion(category, renderedHTML, stylesFilename)
     return
 
 def generateTitlePDF():
     renderedHTML = renderTitleHTML()
-    outputPDFFilename = "output//title.pdf"
-    outputHTMLFilename = "output//title.html"
     stylesFilename = "templates//title_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("title", renderedHTML, stylesFilename)
     return
 
 def generateSpiceUsesPDF(pageNumber):
     renderedHTML = renderSpiceUsesHTML(pageNumber)
-    outputPDFFilename = "output//spice_uses.pdf"
-    outputHTMLFilename = "output//spice_uses.html"
     stylesFilename = "templates//spice_uses_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("spice_uses", renderedHTML, stylesFilename)
     return
 
 def generateSubstitutionsPDF(pageNumber):
     renderedHTML = renderSubstitutionsHTML(pageNumber)
-    outputPDFFilename = "output//substitutions.pdf"
-    outputHTMLFilename = "output//substitutions.html"
     stylesFilename = "templates//substitutions_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("substitutions", renderedHTML, stylesFilename)
     return
     
 def generateUnitConversionsPDF(pageNumber):
     renderedHTML = renderUnitConversionsHTML(pageNumber)
-    outputPDFFilename = "output//unit_conversions.pdf"
-    outputHTMLFilename = "output//unit_conversions.html"
     stylesFilename = "templates//unit_conversions_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("unit_conversions", renderedHTML, stylesFilename)
     return
 
 def generateSousVidePDF(pageNumber):
     renderedHTML = renderSousVideHTML(pageNumber)
-    outputPDFFilename = "output//sous_vide.pdf"
-    outputHTMLFilename = "output//sous_vide.html"
     stylesFilename = "templates//sous_vide_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("sous_vide", renderedHTML, stylesFilename)
     return
 
 def generateDedicationPDF(dedicationText):
     renderedHTML = renderDedicationHTML(dedicationText)
-    outputPDFFilename = "output//dedication.pdf"
-    outputHTMLFilename = "output//dedication.html"
     stylesFilename = "templates//dedication_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("dedication", renderedHTML, stylesFilename)
     return
 
 def generateToCPDF():
     renderedHTML = renderToCHTML()
-    outputPDFFilename = "output//toc.pdf"
-    outputHTMLFilename = "output//toc.html"
     stylesFilename = "templates//toc_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("toc", renderedHTML, stylesFilename)
     return
 
 def generateIndexPDF():
     renderedHTML = renderIndexHTML()
-    outputPDFFilename = "output//index.pdf"
-    outputHTMLFilename = "output//index.html"
     stylesFilename = "templates//index_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("index", renderedHTML, stylesFilename)
     return
 
 def getRecipeAndConvertToPDF(recipeSlug, categorySlug, recipeNumber):
     renderedHTML = getRecipeAndRenderHTML(recipeSlug, recipeNumber)
-    if not os.path.exists("output/{}".format(categorySlug)):
-        os.mkdir("output/{}".format(categorySlug))
-    outputPDFFilename = "output//{}//{}.pdf".format(categorySlug, recipeSlug)
-    outputHTMLFilename = "output//{}//{}.html".format(categorySlug, recipeSlug)
     stylesFilename = "templates//recipe_page_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    queuePdfConversion("{}/{}".format(categorySlug, recipeSlug), renderedHTML, stylesFilename, recipeSlug)
     return
 
 def generateSingleRecipePage(recipeSlug):
-    recipeData = fetchRecipeData(recipeSlug)
-    renderedHTML = recipeTemplate.render(data=recipeData,image=recipeData.get("imageUrl"),recipeNumber=123)
-    outputPDFFilename = "output//{}.pdf".format(recipeSlug)
-    outputHTMLFilename = "output//{}.html".format(recipeSlug)
+    if args.offline:
+        storeItems = loadStoreForOffline()["items"]
+        if recipeSlug not in storeItems:
+            if args.from_backup:
+                sys.exit("Recipe {} is not in {}".format(recipeSlug, args.from_backup))
+            sys.exit("Recipe {} is not in {}; run once without --offline".format(recipeSlug, RECIPE_STORE_FILENAME))
+        recipeData = storeItems[recipeSlug]
+    else:
+        recipeData = fetchRecipeData(recipeSlug)
+    prepareRecipeImages([recipeData])
+    prepareIngredientLines(recipeData)
+    renderedHTML = getPageTemplate("recipe_page_template.html").render(data=recipeData,image=getRecipeImageSource(recipeData),ingredientLines=globalIngredientLines[recipeSlug],recipeNumber=123)
     stylesFilename = "templates//recipe_page_template.css"
-    saveHtml(renderedHTML, outputHTMLFilename)
-    convertHtmlToPdf(outputHTMLFilename, stylesFilename, outputPDFFilename)
+    if args.keep_artifacts:
+        saveArtifact(recipeSlug + ".html", renderedHTML)
+    pdfContent, timings = convertHtmlToPdf(renderedHTML, stylesFilename)
+    recordConversion(timings, recipeSlug)
+    saveArtifact(recipeSlug + ".pdf", pdfContent)
     return
 
 
 # COMBINING PDFs =========================================================================
-def combinePDFs():
-    #merger = PdfFileMerger()
-    merger = PdfMerger()
-    merger.append("output//title.pdf")
-    if DEDICATION != None:
-        merger.append("output//dedication.pdf")
-    merger.append("output//toc.pdf")
+BOOK_FILENAME = "recipe_book_preview.pdf"
+
+def getBookPageNames():
+    pageNames = []
+    pageNames.append("title")
+    if DEDICATION != None and DEDICATION != "":
+        pageNames.append("dedication")
+    pageNames.append("toc")
     if args.static_pages:
-        merger.append("output//spice_uses.pdf")
-        merger.append("output//substitutions.pdf")
-        merger.append("output//unit_conversions.pdf")
-        merger.append("output//sous_vide.pdf")
+        pageNames.append("spice_uses")
+        pageNames.append("substitutions")
+        pageNames.append("unit_conversions")
+        pageNames.append("sous_vide")
     for categorySlug in globalCategoryManifest:
-        print("Combining PDFs for category: {}".format(categorySlug))
-        sectionFileName = "output//{}.pdf".format(categorySlug)
-        merger.append(sectionFileName)
+        pageNames.append(categorySlug)
         for recipe in globalCategoryManifest[categorySlug]:
-            recipeFileName = "output//{}//{}.pdf".format(categorySlug, recipe)
-            merger.append(recipeFileName)
-    merger.append("output//index.pdf")
-        
-    merger.write("recipe_book_preview.pdf")
-    merger.close()
+            pageNames.append("{}/{}".format(categorySlug, recipe))
+    pageNames.append("index")
+    return pageNames
+
+def combinePDFs(bookFilename):
+    from PyPDF2 import PdfMerger
+    #merger = PdfFileMerger()
+    merger = PdfMerger()
+    pageNames = getBookPageNames()
+    # First page of every part of the book, for the outline
+    pageStarts = {}
+    print("Combining {} PDFs".format(len(pageNames)))
+    with timedStage("combine"):
+        for pageName in pageNames:
+            pageStarts[pageName] = len(merger.pages)
+            merger.append(io.BytesIO(renderedPages[pageName]))
+
+        merger.write(bookFilename)
+        merger.close()
+    countMetric("bookBytes", os.path.getsize(bookFilename))
+    return pageStarts
+
+def renderBookSinglePass(bookFilename):
+    # Every page is laid out as its own document but they all share one
+    # FontConfiguration, and the pages are written out as a single PDF, so each
+    # font is embedded and subset once instead of once per page
+    from weasyprint import HTML
+    pages = []
+    pageStarts = {}
+    pageNames = getBookPageNames()
+    print("Rendering {} pages in a single pass".format(len(pageNames)))
+    for pageName in pageNames:
+        htmlContent, stylesFilename = singlePassPages[pageName]
+        css = getStylesheet(stylesFilename)
+        html = HTML(string=htmlContent,base_url='base_url')
+        with timedStage("layout"):
+            document = html.render(stylesheets=[css], font_config=sharedFontConfig)
+        pageStarts[pageName] = len(pages)
+        pages.extend(document.pages)
+    with timedStage("writePdf"):
+        document.copy(pages).write_pdf(bookFilename)
+    countMetric("pdfPages", len(pages))
+    countMetric("bookBytes", os.path.getsize(bookFilename))
+    return pageStarts
+
+def assembleBook(bookFilename):
+    if args.single_pass:
+        pageStarts = renderBookSinglePass(bookFilename)
+    else:
+        pageStarts = combinePDFs(bookFilename)
+    if args.optimize or args.linearize:
+        optimizeBook(bookFilename, pageStarts)
+    return
+
+
+# OPTIMIZING THE BOOK ====================================================================
+# --optimize rewrites the finished book. Pages rendered on their own each carry their own
+# copy of fonts and images, so resources that are byte for byte the same are merged
+# into one object, content streams are compressed, and an outline with a bookmark per
+# category and recipe is added. With pikepdf installed the book is also written with
+# object streams, and --linearize makes the first page show before the rest has loaded.
+RESOURCE_KEYS = ["/Font", "/XObject", "/ExtGState", "/Pattern", "/Shading", "/ColorSpace"]
+
+def getObjectDigest(pdfObject, objectDigests):
+    # The digest of an indirect object stands for its content, so two objects with
+    # the same content, and references to the same content, end up equal
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+    if isinstance(pdfObject, IndirectObject):
+        if pdfObject.idnum not in objectDigests:
+            # Marks the object while its digest is worked out, in case it refers back
+            objectDigests[pdfObject.idnum] = "ref{}".format(pdfObject.idnum)
+            objectDigests[pdfObject.idnum] = getObjectDigest(pdfObject.get_object(), objectDigests)
+        return objectDigests[pdfObject.idnum]
+    digest = hashlib.sha256(type(pdfObject).__name__.encode())
+    if isinstance(pdfObject, DictionaryObject):
+        for key in sorted(pdfObject):
+            digest.update(key.encode())
+            digest.update(getObjectDigest(pdfObject.raw_get(key), objectDigests).encode())
+        if isinstance(pdfObject, StreamObject):
+            digest.update(pdfObject._data)
+    elif isinstance(pdfObject, ArrayObject):
+        for item in pdfObject:
+            digest.update(getObjectDigest(item, objectDigests).encode())
+    else:
+        digest.update(repr(pdfObject).encode())
+    return digest.hexdigest()
+
+def dedupeReferences(container, objectDigests, canonicalObjects, visited):
+    # Points every reference below container at the first object seen with the same
+    # content. Returns how many references were redirected.
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+    redirected = 0
+    items = container.items() if isinstance(container, DictionaryObject) else enumerate(container)
+    for key, value in list(items):
+        if isinstance(value, IndirectObject):
+            canonicalObject = canonicalObjects.setdefault(getObjectDigest(value, objectDigests), value)
+            if canonicalObject.idnum != value.idnum:
+                container[key] = canonicalObject
+                redirected += 1
+            elif value.idnum not in visited:
+                visited.add(value.idnum)
+                resolved = value.get_object()
+                if isinstance(resolved, (DictionaryObject, ArrayObject)):
+                    redirected += dedupeReferences(resolved, objectDigests, canonicalObjects, visited)
+        elif isinstance(value, (DictionaryObject, ArrayObject)):
+            redirected += dedupeReferences(value, objectDigests, canonicalObjects, visited)
+    return redirected
+
+def dedupePageResources(reader):
+    from PyPDF2.generic import ArrayObject, DictionaryObject
+    objectDigests = {}
+    canonicalObjects = {}
+    visited = set()
+    redirected = 0
+    for page in reader.pages:
+        resources = page.get("/Resources")
+        if resources is None:
+            continue
+        resources = resources.get_object()
+        for resourceKey in RESOURCE_KEYS:
+            if resourceKey in resources:
+                resourceDict = resources[resourceKey]
+                if isinstance(resourceDict, (DictionaryObject, ArrayObject)):
+                    redirected += dedupeReferences(resourceDict, objectDigests, canonicalObjects, visited)
+    return redirected
+
+def compressContentStreams(writer):
+    # Compressed in place: PyPDF2's PageObject.compress_content_streams leaves the new
+    # stream inline in the page dictionary, which other PDF readers reject
+    from PyPDF2.generic import ArrayObject, NameObject, StreamObject
+    for page in writer.pages:
+        contents = page.get("/Contents")
+        if contents is None:
+            continue
+        contents = contents.get_object()
+        for contentStream in contents if isinstance(contents, ArrayObject) else [contents]:
+            contentStream = contentStream.get_object()
+            if isinstance(contentStream, StreamObject) and "/Filter" not in contentStream:
+                contentStream._data = zlib.compress(contentStream._data)
+                contentStream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    return
+
+def getBookOutline(pageStarts):
+    outline = []
+    for categorySlug in globalCategoryManifest:
+        recipeItems = []
+        for recipeSlug in globalCategoryManifest[categorySlug]:
+            recipeItems.append((getRecipeName(recipeSlug), pageStarts["{}/{}".format(categorySlug, recipeSlug)]))
+        outline.append((getCategoryName(categorySlug), pageStarts[categorySlug], recipeItems))
+    return outline
+
+def optimizeBook(bookFilename, pageStarts):
+    from PyPDF2 import PdfReader, PdfWriter
+    try:
+        import pikepdf
+    except ImportError:
+        # Optional; without it --optimize can't write object streams or linearize
+        pikepdf = None
+    bytesBefore = os.path.getsize(bookFilename)
+    with timedStage("optimize"):
+        reader = PdfReader(bookFilename)
+        redirected = dedupePageResources(reader)
+        # Pages are copied with only the objects they still reach, which leaves the
+        # duplicates behind
+        writer = PdfWriter()
+        for page in reader.pages:
+            writer.add_page(page)
+        compressContentStreams(writer)
+        for categoryName, categoryPage, recipeItems in getBookOutline(pageStarts):
+            categoryItem = writer.add_outline_item(categoryName, categoryPage)
+            for recipeName, recipePage in recipeItems:
+                writer.add_outline_item(recipeName, recipePage, parent=categoryItem)
+
+        tempFilename = bookFilename + ".tmp"
+        if pikepdf is None:
+            writer.write(tempFilename)
+        else:
+            rewritten = io.BytesIO()
+            writer.write(rewritten)
+            rewritten.seek(0)
+            with pikepdf.open(rewritten) as pdf:
+                pdf.save(tempFilename, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate, linearize=args.linearize)
+        os.replace(tempFilename, bookFilename)
+
+    bytesAfter = os.path.getsize(bookFilename)
+    countMetric("optimizedBookBytes", bytesAfter)
+    print("Optimized {}: {:.1f} MB -> {:.1f} MB ({:+.0f}%), {} duplicate resources merged".format(
+        bookFilename, bytesBefore / 1e6, bytesAfter / 1e6, (bytesAfter / bytesBefore - 1) * 100, redirected))
+    if pikepdf is None:
+        print("  Install pikepdf to also write object streams{}".format(" and linearize" if args.linearize else ""))
+    return
 
 
 # FILE MANAGEMENT ========================================================================
 def prepareOutputDir():
-    if os.path.exists("output"):
-        shutil.rmtree("output")
-    os.mkdir("output")
+    if os.path.exists(OUTPUT_DIR):
+        shutil.rmtree(OUTPUT_DIR)
+    os.mkdir(OUTPUT_DIR)
     return
 
 
 # MANIFEST MANAGEMENT ====================================================================
 def buildCategoryManifest(categories):
     # Build list from categories
-    recipeNumber = 1
     manifest = {}
 
     for categorySlug in categories:
         recipeSlugs = sorted(getRecipeSlugsWithCategory(categorySlug))
         if len(recipeSlugs) > 0:
-            manifest[categorySlug] = []
-        for recipeSlug in recipeSlugs:
-            manifest[categorySlug].append(recipeSlug)
-            setRecipeNumber(recipeSlug, recipeNumber)
-            recipeNumber += 1
+            manifest[categorySlug] = recipeSlugs
     return manifest
 
-def recipeInCategoryManifest(recipeName):
-    for categorySlug in globalCategoryManifest:
-        for recipeSlug in globalCategoryManifest[categorySlug]:
-            if recipeSlug == recipeName:
-                return True
-    return False
+def buildRecipeLocations(manifest):
+    # slug -> (category, recipe number) for every recipe in the book, numbered in
+    # manifest order. Membership and number lookups go through this instead of
+    # walking the manifest.
+    recipeNumber = 1
+    locations = {}
+
+    for categorySlug in manifest:
+        for recipeSlug in manifest[categorySlug]:
+            locations[recipeSlug] = (categorySlug, recipeNumber)
+            recipeNumber += 1
+    return locations
+
+def recipeInCategoryManifest(recipeSlug):
+    return recipeSlug in globalRecipeLocations
 
 def buildIngredientManifest(foodList):
     manifest = {}
@@ -514,9 +1478,9 @@ def buildStaticPagesCatalog():
 def dumpIngredientList():
     foodDict = {}
     for recipe in globalRecipeCache.get("items"):
-        for ingredient in globalRecipeCache.get("items")[recipe].get("recipeIngredient"):
-            if ingredient.get("food"):
-                foodDict[ingredient.get("food").get("name")] = ""
+        for ingredient in globalRecipeCache.get("items")[recipe].recipeIngredient:
+            if ingredient.food:
+                foodDict[ingredient.food.name] = ""
     with open("ingredientsForIndex.txt", "w") as file:
         for item in foodDict.keys():
             file.write(item + "\n")
@@ -538,58 +1502,776 @@ def readDedicationFromFile(filePath):
 
 # RECIPE POLISHING ========================================================================
 # https://regex101.com
-
-def findAndPrintOvenTempsInSteps():
+# Every check is compiled once and run over each recipe in a single pass. Findings are
+# printed grouped by check, or written as JSON or SARIF for other tools to pick up.
+LINT_RULES = [
+    # rule id, what it looks at, heading for the text output, pattern, and the characters
+    # every match starts with (if known), which lets the search skip ahead cheaply
     # °F
-    print("\nChecking for Oven Temps...\n")
-    regex = "(\d *(f|F)[^°F|\w])|(\d\.)|((f|F)ahrenheit)|((C|c)elsius)|((d|D)egree)"
-    findAndPrintStringsInSteps(regex)
+    ("oven-temperature", "step", "Oven Temps", r"(\d *(f|F)[^°F|\w])|(\d\.)|((f|F)ahrenheit)|((C|c)elsius)|((d|D)egree)", r"[\dfFcCdD]"),
+    ("measurement-shorthand", "step", "Measurements", r"(( |\d)(c|C)( |\W)|( |\d)(t|T)( |\W)|( |\d)(t|T)sp |( |\d)(t|T)bsp |( |\d)(m|M)in( |\.)|( |\d)(h|H)r( |\.)|(( |\d)(c|C)( |\W)|( |\d)(t|T)( |\W)|( |\d)(t|T)sp |( |\d)(t|T)bsp |( |\d)(m|M)in |(m|M)( |\W))(m|M)( |\W))|( \d *(in|In)( |\.))", r"[ \dmM]"),
+    ("missing-period", "step", "lines not ending in period", r"[^(\.|\!)]\Z", None),
+    # <sup>1</sup>&frasl;<sub>2</sub>
+    ("fraction", "step", "fractions", r"(\d *\/ *\d)", None),
+    ("possessive-title", "title", "posessive titles", r"'", None),
+]
+LINT_BATCH_SIZE = 200
+
+@dataclasses.dataclass(slots=True)
+class LintFinding:
+    rule: str
+    recipeSlug: str
+    stepIndex: int
+    start: int
+    end: int
+    text: str
+
+@functools.lru_cache(maxsize=None)
+def getCompiledLintRules(scopes):
+    compiledRules = []
+    for ruleId, scope, _, pattern, leadingCharacters in LINT_RULES:
+        if scope in scopes:
+            if leadingCharacters:
+                # A lookahead on the first character finds the same matches at the same spans
+                pattern = "(?={})(?:{})".format(leadingCharacters, pattern)
+            compiledRules.append((ruleId, scope, re.compile(pattern)))
+    return compiledRules
+
+def lintRecipeBatch(recipeEntries, scopes):
+    # Runs in the --jobs workers too, so it only gets plain (slug, title, step texts) tuples
+    compiledRules = getCompiledLintRules(scopes)
+    findings = []
+    for recipeSlug, recipeTitle, stepTexts in recipeEntries:
+        for ruleId, scope, compiledRule in compiledRules:
+            if scope == "title":
+                match = compiledRule.search(recipeTitle)
+                if match:
+                    findings.append(LintFinding(ruleId, recipeSlug, None, match.start(), match.end(), recipeTitle))
+                continue
+            for stepIndex, stepText in enumerate(stepTexts):
+                match = compiledRule.search(stepText)
+                if match:
+                    findings.append(LintFinding(ruleId, recipeSlug, stepIndex, match.start(), match.end(), stepText))
+    return findings
+
+def lintRecipes(scopes):
+    recipeEntries = []
+    for recipe in globalRecipeCache.get("items"):
+        recipeObject = globalRecipeCache.get("items")[recipe]
+        recipeEntries.append((recipe, recipeObject.name, [step.text for step in recipeObject.recipeInstructions]))
+    batches = [recipeEntries[i:i + LINT_BATCH_SIZE] for i in range(0, len(recipeEntries), LINT_BATCH_SIZE)]
+
+    with timedStage("lint"):
+        if renderPool is None:
+            batchFindings = [lintRecipeBatch(batch, scopes) for batch in batches]
+        else:
+            batchFindings = renderPool.map(lintRecipeBatch, batches, [scopes] * len(batches))
+        findings = [finding for findings in batchFindings for finding in findings]
+
+    # Grouped by check like the old one-check-at-a-time output, recipes in library order
+    ruleOrder = {rule[0]: position for position, rule in enumerate(LINT_RULES)}
+    findings.sort(key=lambda finding: ruleOrder[finding.rule])
+    countMetric("lintFindings", len(findings))
+    return findings
+
+def formatLintText(findings, scopes):
+    lines = []
+    for ruleId, scope, heading, _, _ in LINT_RULES:
+        if scope not in scopes:
+            continue
+        lines.append("\nChecking for {}...\n".format(heading))
+        for finding in findings:
+            if finding.rule == ruleId:
+                lines.append(finding.recipeSlug + "  -  " + finding.text)
+    return "\n".join(lines) + "\n"
+
+def buildLintJson(findings):
+    return json.dumps([dataclasses.asdict(finding) for finding in findings], indent=2)
+
+def buildLintSarif(findings, scopes):
+    rules = [{"id": ruleId, "shortDescription": {"text": "Check for " + heading}}
+             for ruleId, scope, heading, _, _ in LINT_RULES if scope in scopes]
+    results = []
+    for finding in findings:
+        if finding.stepIndex is None:
+            location = "{}/name".format(finding.recipeSlug)
+        else:
+            location = "{}/recipeInstructions/{}".format(finding.recipeSlug, finding.stepIndex)
+        results.append({"ruleId": finding.rule,
+                         "level": "warning",
+                         "message": {"text": finding.text},
+                         "locations": [{"logicalLocations": [{"fullyQualifiedName": location, "kind": "member"}]}],
+                         "properties": {"start": finding.start, "end": finding.end}})
+    sarif = {"$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+             "version": "2.1.0",
+             "runs": [{"tool": {"driver": {"name": "mealie-cookbook-lint", "rules": rules}}, "results": results}]}
+    return json.dumps(sarif, indent=2)
+
+def writeLintReport(findings, scopes):
+    if args.lintFormat == "text":
+        report = formatLintText(findings, scopes)
+    elif args.lintFormat == "json":
+        report = buildLintJson(findings)
+    else:
+        report = buildLintSarif(findings, scopes)
+
+    # Machine readable reports go to a file so the progress output can't mix into them
+    outputFilename = args.lintOutput
+    if outputFilename is None and args.lintFormat != "text":
+        outputFilename = "lint_report." + args.lintFormat
+    if outputFilename is None:
+        print(report, end="")
+    else:
+        with open(outputFilename, "w") as f:
+            f.write(report)
+        print("{} findings written to {}".format(len(findings), outputFilename))
     return
 
-def findAndPrintMeasurementsInSteps():
-    print("\nChecking for Measurements...\n")
-    regex = "(( |\d)(c|C)( |\W)|( |\d)(t|T)( |\W)|( |\d)(t|T)sp |( |\d)(t|T)bsp |( |\d)(m|M)in( |\.)|( |\d)(h|H)r( |\.)|(( |\d)(c|C)( |\W)|( |\d)(t|T)( |\W)|( |\d)(t|T)sp |( |\d)(t|T)bsp |( |\d)(m|M)in |(m|M)( |\W))(m|M)( |\W))|( \d *(in|In)( |\.))"
-    findAndPrintStringsInSteps(regex)
+
+# RUN REPORT =============================================================================
+# Every run times its stages (per recipe where there is one), counts bytes, statuses and
+# cache hits, and writes it all to run_report.json so builds can be compared and slow
+# recipes found. Fetch and image threads record concurrently, hence the lock.
+RUN_REPORT_FILENAME = "run_report.json"
+SLOWEST_RECIPE_COUNT = 10
+
+metricsLock = threading.Lock()
+
+def newRunMetrics():
+    return {"startTime": time.perf_counter(), "firstRecipePage": None, "stages": {}, "counters": {}, "recipes": {}}
+
+@contextlib.contextmanager
+def timedStage(stageName, recipeSlug=None):
+    startTime = time.perf_counter()
+    try:
+        yield
+    finally:
+        recordStageTime(stageName, time.perf_counter() - startTime, recipeSlug)
+
+def recordStageTime(stageName, seconds, recipeSlug=None):
+    with metricsLock:
+        stage = runMetrics["stages"].setdefault(stageName, {"calls": 0, "seconds": 0.0, "maxSeconds": 0.0})
+        stage["calls"] += 1
+        stage["seconds"] += seconds
+        stage["maxSeconds"] = max(stage["maxSeconds"], seconds)
+        if recipeSlug:
+            recipeStages = runMetrics["recipes"].setdefault(recipeSlug, {})
+            recipeStages[stageName] = recipeStages.get(stageName, 0.0) + seconds
     return
 
-def findAndPrintFractionsInSteps():
-    # <sup>1</sup>&frasl;<sub>2</sub>
-    print("\nChecking for fractions...\n")
-    regex = "(\d *\/ *\d)"
-    findAndPrintStringsInSteps(regex)
+def countMetric(counterName, amount=1):
+    with metricsLock:
+        runMetrics["counters"][counterName] = runMetrics["counters"].get(counterName, 0) + amount
     return
 
-def findAndPrintLinesNotEndingWithPeriod():
-    print("\nChecking for lines not ending in period...\n")
-    regex = "[^(\.|\!)]\Z"
-    findAndPrintStringsInSteps(regex)
+def recordFirstRecipePage():
+    with metricsLock:
+        if runMetrics["firstRecipePage"] is None:
+            runMetrics["firstRecipePage"] = time.perf_counter() - runMetrics["startTime"]
     return
 
-def findAndPrintStringsInSteps(regex):
-    for recipe in globalRecipeCache.get("items"):
-        recipeObject = globalRecipeCache.get("items")[recipe]
-        for step in recipeObject.get("recipeInstructions"):
-            stepText = step.get("text")
-            result = re.search(regex, stepText)
-            if result != None:
-                print(recipe + "  -  " + stepText)
+def getPeakMemoryMB():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peakSelf = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    peakWorkers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return {"main": round(peakSelf, 1), "largestWorker": round(peakWorkers, 1)}
+
+def getSlowestRecipes(count):
+    recipeTotals = []
+    for recipeSlug, recipeStages in runMetrics["recipes"].items():
+        recipeTotals.append((sum(recipeStages.values()), recipeSlug, recipeStages))
+    slowest = []
+    for totalSeconds, recipeSlug, recipeStages in sorted(recipeTotals, key=lambda entry: entry[0], reverse=True)[:count]:
+        slowest.append({"slug": recipeSlug,
+                        "seconds": round(totalSeconds, 4),
+                        "stages": {stageName: round(seconds, 4) for stageName, seconds in recipeStages.items()}})
+    return slowest
+
+def buildRunReport():
+    stages = {}
+    for stageName, stage in runMetrics["stages"].items():
+        stages[stageName] = {"calls": stage["calls"],
+                             "seconds": round(stage["seconds"], 4),
+                             "meanSeconds": round(stage["seconds"] / stage["calls"], 4),
+                             "maxSeconds": round(stage["maxSeconds"], 4)}
+    firstRecipePage = runMetrics["firstRecipePage"]
+    return {"arguments": vars(args),
+            "finishedAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "totalSeconds": round(time.perf_counter() - runMetrics["startTime"], 4),
+            "firstRecipePageSeconds": round(firstRecipePage, 4) if firstRecipePage is not None else None,
+            "peakMemoryMB": getPeakMemoryMB(),
+            "stages": stages,
+            "counters": dict(sorted(runMetrics["counters"].items())),
+            "slowestRecipes": getSlowestRecipes(SLOWEST_RECIPE_COUNT)}
+
+def writeRunReport():
+    report = buildRunReport()
+    with open(RUN_REPORT_FILENAME, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Run took {:.1f}s, report written to {}".format(report["totalSeconds"], RUN_REPORT_FILENAME))
+    for stageName, stage in sorted(report["stages"].items(), key=lambda entry: entry[1]["seconds"], reverse=True):
+        print("  {:<15} {:>9.2f}s over {} calls".format(stageName, stage["seconds"], stage["calls"]))
     return
 
-def findAndPrintPosessiveTitles():
-    print("\nChecking for posessive titles...\n")
-    regex = "'"
-    findAndPrintLinesInTitle(regex)
+def writeProfile(profiler, profileFilename):
+    profiler.dump_stats(profileFilename)
+    print("Profile written to {}, top functions by cumulative time:".format(profileFilename))
+    pstats.Stats(profileFilename).sort_stats("cumulative").print_stats(15)
     return
 
-def findAndPrintLinesInTitle(regex):
-    for recipe in globalRecipeCache.get("items"):
-        recipeTitle = globalRecipeCache.get("items")[recipe].get("name")
-        result = re.search(regex, recipeTitle)
-        if result != None:
-                print(recipe + "  -  " + recipeTitle)
+
+# BUILDING THE BOOK ======================================================================
+# The book is built as a pipeline. The recipe listing alone is enough to number every
+# recipe and lay out the title, ToC and section pages. Full recipes are then fetched a
+# few at a time in book order, their images prepared, and each page rendered as soon as
+# its recipe arrives, so rendering overlaps the downloads. The index needs every
+# recipe's ingredients, so it comes last.
+def buildCookbook():
+    global globalRecipeCache
+
+    print("Building caches...")
+    if args.offline:
+        store = loadStoreForOffline()
+        listedStamps = None
+        globalRecipeCache = loadRecipesFromStore()
+    else:
+        store = loadRecipeStore()
+        summaries, listedStamps = listRecipeSummaries()
+        evictDeletedRecipes(store, listedStamps)
+        globalRecipeCache = {"items": summaries}
+    buildBookManifests()
+    generateFrontPages()
+
+    imageSizesList = []
+    fullRecipes = streamFullRecipes(list(globalRecipeLocations), store, listedStamps)
+    for recipeSlug, fullRecipeData, imageSizes in streamInOrder(prepareRecipePage, fullRecipes):
+        globalRecipeCache.get("items")[recipeSlug] = fullRecipeData
+        imageSizesList.append(imageSizes)
+        categorySlug, recipeNumber = globalRecipeLocations[recipeSlug]
+        print("  Recipe: " + recipeSlug)
+        getRecipeAndConvertToPDF(recipeSlug, categorySlug, recipeNumber)
+    if not args.offline:
+        saveRecipeStore(store)
+    reportImageSavings(imageSizesList)
+
+    # Foods are only known now that the full recipes are in
+    buildBookIndex()
+    generateIndexPDF()
+    with timedStage("waitForRenders"):
+        waitForPdfConversions()
+
+    assembleBook(BOOK_FILENAME)
+    return store
+
+def buildBookManifests():
+    global globalCategoryCache, globalTagCache, globalRecipeIndex
+    global globalCategoryManifest, globalRecipeLocations, globalTagManifest, globalStaticCatalog
+    with timedStage("manifests"):
+        globalCategoryCache = generateCategoryCache()
+        globalTagCache = generateTagCache()
+        globalRecipeIndex = buildRecipeIndex()
+
+        globalCategoryManifest = buildCategoryManifest(args.categories)
+        globalRecipeLocations = buildRecipeLocations(globalCategoryManifest)
+        globalTagManifest = buildTagManifest()
+
+    globalStaticCatalog = buildStaticPagesCatalog()
+    return
+
+def generateFrontPages():
+    generateTitlePDF()
+
+    if args.static_pages:
+        generateSpiceUsesPDF(globalStaticCatalog['Herb Uses'])
+        generateSubstitutionsPDF(globalStaticCatalog['Substitutions'])
+        generateUnitConversionsPDF(globalStaticCatalog['Unit Conversions'])
+        generateSousVidePDF(globalStaticCatalog['Sous Vide Times'])
+
+    if DEDICATION != None and DEDICATION != "":
+        generateDedicationPDF(DEDICATION)
+
+    generateToCPDF()
+    for categorySlug in globalCategoryManifest:
+        print("Category: " + categorySlug)
+        generateSectionHeaderPDF(categorySlug)
+    return
+
+def buildBookIndex():
+    global globalRecipeIndex, globalIngredientManifest, globalIndexCatalog
+    with timedStage("index"):
+        globalRecipeIndex = buildRecipeIndex()
+        if args.foods:
+            globalIngredientManifest = buildIngredientManifest(args.foods)
+        elif args.foodFile:
+            globalIngredientManifest = buildIngredientManifest(readFoodsFromFile("ingredientsForIndex.txt"))
+        else:
+            globalIngredientManifest = buildIngredientManifest([])
+
+        print("Building Index")
+        globalIndexCatalog = buildIndexCatalog()
+    return
+
+def prepareRecipePage(recipe):
+    recipeSlug, fullRecipeData = recipe
+    prepareIngredientLines(fullRecipeData)
+    return recipeSlug, fullRecipeData, prepareRecipeImage(fullRecipeData)
+
+
+# WATCH MODE =============================================================================
+# --watch keeps the process alive after the first build, and with it the recipe store,
+# the manifests, the loaded fonts and every rendered page. templates/, fonts/ and
+# config.ini are checked every second and Mealie is polled every --pollInterval seconds.
+# On a change only the pages that depend on it are rendered again: an edited recipe, the
+# recipes whose numbers moved, or every recipe when the recipe template, its stylesheet,
+# the fonts or the config change. The title, ToC, section and index pages are cheap to
+# render to HTML and only go on to WeasyPrint when that HTML changed.
+WATCH_FILE_INTERVAL = 1
+RECIPE_PAGE_FILES = {"recipe_page_template.html", "recipe_page_template.css"}
+
+def snapshotWatchedFiles():
+    snapshot = {}
+    for watchedPath in (TEMPLATES_DIR, FONTS_DIR, CONFIG_FILENAME):
+        if os.path.isdir(watchedPath):
+            filenames = [entry.path for entry in os.scandir(watchedPath) if entry.is_file()]
+        else:
+            filenames = [watchedPath] if os.path.exists(watchedPath) else []
+        for filename in filenames:
+            fileStat = os.stat(filename)
+            snapshot[filename] = (fileStat.st_mtime_ns, fileStat.st_size)
+    return snapshot
+
+def getChangedFiles(previousSnapshot, snapshot):
+    return sorted(filename for filename in previousSnapshot.keys() | snapshot.keys()
+                  if previousSnapshot.get(filename) != snapshot.get(filename))
+
+def reloadChangedFiles(changedFiles):
+    # Returns True when every recipe page needs rendering again
+    global mealieSession, renderPool, sharedFontConfig
+    getFileDigest.cache_clear()
+    fontsChanged = any(os.path.dirname(filename) == FONTS_DIR for filename in changedFiles)
+    allRecipes = fontsChanged or any(os.path.basename(filename) in RECIPE_PAGE_FILES for filename in changedFiles)
+    if CONFIG_FILENAME in changedFiles:
+        loadConfig()
+        mealieSession = None
+        allRecipes = True
+    if any(filename.endswith(".html") for filename in changedFiles):
+        pageTemplates.clear()
+    if fontsChanged or any(filename.endswith(".css") for filename in changedFiles):
+        # Stylesheets hold on to the fonts they loaded, and the --jobs workers keep
+        # their own stylesheets, so both start over
+        sharedFontConfig = None
+        stylesheetRegistry.clear()
+        if renderPool is not None:
+            renderPool.shutdown()
+            renderPool = startRenderPool(args.jobs)
+    return allRecipes
+
+def pollRecipeChanges(store):
+    # Returns the recipes that are new to the book or were updated in Mealie, and the
+    # ones that left it, since the last poll
+    bookItems = globalRecipeCache.get("items")
+    summaries, listedStamps = listRecipeSummaries()
+    changedSlugs = [recipeSlug for recipeSlug in summaries
+                    if recipeSlug not in bookItems or not recipeIsFreshInStore(store, recipeSlug, listedStamps[recipeSlug])]
+    removedSlugs = [recipeSlug for recipeSlug in bookItems if recipeSlug not in summaries]
+    if not changedSlugs and not removedSlugs:
+        return changedSlugs, removedSlugs
+
+    evictDeletedRecipes(store, listedStamps)
+    for recipeSlug in removedSlugs:
+        del bookItems[recipeSlug]
+        globalIngredientLines.pop(recipeSlug, None)
+        globalRecipeImages.pop(recipeSlug, None)
+    fullRecipes = streamFullRecipes(changedSlugs, store, listedStamps)
+    for recipeSlug, fullRecipeData, imageSizes in streamInOrder(prepareRecipePage, fullRecipes):
+        bookItems[recipeSlug] = fullRecipeData
+    saveRecipeStore(store)
+    return changedSlugs, removedSlugs
+
+def rebuildCookbook(changedFiles, changedSlugs, allRecipes=False):
+    startTime = time.perf_counter()
+    renderedBefore = runMetrics["counters"].get("pagesRendered", 0)
+    if changedFiles:
+        allRecipes = reloadChangedFiles(changedFiles) or allRecipes
+
+    previousLocations = globalRecipeLocations
+    buildBookManifests()
+    changedSlugs = set(changedSlugs)
+    recipeSlugs = [recipeSlug for recipeSlug in globalRecipeLocations
+                   if allRecipes or recipeSlug in changedSlugs or previousLocations.get(recipeSlug) != globalRecipeLocations[recipeSlug]]
+
+    generateFrontPages()
+    for recipeSlug in recipeSlugs:
+        categorySlug, recipeNumber = globalRecipeLocations[recipeSlug]
+        print("  Recipe: " + recipeSlug)
+        getRecipeAndConvertToPDF(recipeSlug, categorySlug, recipeNumber)
+    buildBookIndex()
+    generateIndexPDF()
+    with timedStage("waitForRenders"):
+        waitForPdfConversions()
+
+    dropPagesOutsideBook()
+    pruneRenderedPdfs(args.cacheSizeMB * 1024 * 1024)
+    assembleBook(BOOK_FILENAME)
+    print("Rebuilt the book in {:.1f}s, {} pages rendered".format(
+        time.perf_counter() - startTime, runMetrics["counters"].get("pagesRendered", 0) - renderedBefore))
+    return
+
+def dropPagesOutsideBook():
+    # Drops the pages of recipes that left the book or moved to another category
+    bookPageNames = set(getBookPageNames())
+    for pageName in list(renderedPages):
+        if pageName not in bookPageNames:
+            del renderedPages[pageName]
+            renderedPageKeys.pop(pageName, None)
+            if args.keep_artifacts:
+                for extension in (".html", ".pdf"):
+                    if os.path.exists(os.path.join(OUTPUT_DIR, pageName + extension)):
+                        os.remove(os.path.join(OUTPUT_DIR, pageName + extension))
+    return
+
+def watchCookbook(store):
+    pollText = "" if args.offline else " and polling Mealie every {:g}s".format(args.pollInterval)
+    print("Watching {}/, {}/ and {}{}, press Ctrl+C to stop".format(TEMPLATES_DIR, FONTS_DIR, CONFIG_FILENAME, pollText))
+    watchedFiles = snapshotWatchedFiles()
+    nextPollTime = time.monotonic() + args.pollInterval
+    # After a failed rebuild its files are reloaded again with the next change, and
+    # every recipe page is checked, since the failed one may have stopped part way
+    retryFiles = []
+    retryAll = False
+    try:
+        while True:
+            time.sleep(WATCH_FILE_INTERVAL)
+            currentFiles = snapshotWatchedFiles()
+            changedFiles = getChangedFiles(watchedFiles, currentFiles)
+            watchedFiles = currentFiles
+
+            changedSlugs, removedSlugs = [], []
+            if not args.offline and time.monotonic() >= nextPollTime:
+                try:
+                    changedSlugs, removedSlugs = pollRecipeChanges(store)
+                except SystemExit as error:
+                    print("Could not poll Mealie: {}".format(error))
+                nextPollTime = time.monotonic() + args.pollInterval
+
+            if not changedFiles and not changedSlugs and not removedSlugs:
+                continue
+            for filename in changedFiles:
+                print("Changed: " + filename)
+            for recipeSlug in changedSlugs:
+                print("Updated in Mealie: " + recipeSlug)
+            for recipeSlug in removedSlugs:
+                print("Removed from Mealie: " + recipeSlug)
+            try:
+                rebuildCookbook(sorted(set(changedFiles) | set(retryFiles)), changedSlugs, retryAll)
+                retryFiles, retryAll = [], False
+            except (Exception, SystemExit) as error:
+                # Usually a file saved half way through an edit, or Mealie briefly away;
+                # the next change tries again
+                pendingPdfConversions.clear()
+                retryFiles, retryAll = sorted(set(changedFiles) | set(retryFiles)), True
+                print("Rebuild failed, keeping the last book: {}: {}".format(type(error).__name__, error))
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    return
+
+
+# EDITIONS ===============================================================================
+# --editions builds several books in one run from an INI file with a section per
+# edition. A section can set title, sub_title, dedication, tag, categories, removeTags,
+# indexIgnoreTags, foods (lists separated by commas), static_pages and output; anything
+# left out comes from config.ini and the command line. The recipes for every edition are
+# listed and fetched once, then each edition gets its own numbering, ToC, index and PDF.
+# Every page rendered in the run is kept by its render key, so a page whose HTML is the
+# same in any two editions (same recipe, same number) is only rendered once.
+EDITION_TEXT_OPTIONS = ["title", "sub_title", "dedication", "tag"]
+EDITION_LIST_OPTIONS = ["categories", "removeTags", "indexIgnoreTags", "foods"]
+
+def getDefaultEdition():
+    # Taken before any edition is applied, since applying one overwrites these
+    edition = {"title": TITLE, "sub_title": SUBTITLE, "dedication": DEDICATION, "tag": args.tag, "static_pages": args.static_pages}
+    for option in EDITION_LIST_OPTIONS:
+        edition[option] = getattr(args, option)
+    return edition
+
+def newEdition(editionName, settings, defaultEdition):
+    edition = dict(defaultEdition, name=editionName, output=editionName + ".pdf")
+    edition.update(settings)
+    return edition
+
+def readEditions(editionsFilename):
+    editionsConfig = configparser.ConfigParser()
+    if not editionsConfig.read(editionsFilename):
+        sys.exit("Could not read editions file {}".format(editionsFilename))
+    defaultEdition = getDefaultEdition()
+    editions = []
+    for editionName in editionsConfig.sections():
+        section = editionsConfig[editionName]
+        settings = {option: section[option] for option in EDITION_TEXT_OPTIONS + ["output"] if option in section}
+        if "static_pages" in section:
+            settings["static_pages"] = section.getboolean("static_pages")
+        for option in EDITION_LIST_OPTIONS:
+            if option in section:
+                settings[option] = [value.strip() for value in section[option].split(",") if value.strip()]
+        edition = newEdition(editionName, settings, defaultEdition)
+        if not edition["categories"]:
+            sys.exit("Edition {} has no categories".format(editionName))
+        editions.append(edition)
+    return editions
+
+def applyEdition(edition):
+    global TITLE, SUBTITLE, DEDICATION
+    TITLE = edition["title"]
+    SUBTITLE = edition["sub_title"]
+    DEDICATION = edition["dedication"]
+    for option in ["tag", "static_pages"] + EDITION_LIST_OPTIONS:
+        setattr(args, option, edition[option])
+    return
+
+def planEditionsQuery(editions):
+    # The listing covers every edition: all their categories, their tag only if they
+    # share one, and no removed tags. Each edition filters the recipes again itself.
+    categories = []
+    for edition in editions:
+        categories.extend(categorySlug for categorySlug in edition["categories"] if categorySlug not in categories)
+    editionTags = {edition["tag"] for edition in editions}
+    args.categories = categories
+    args.tag = editionTags.pop() if len(editionTags) == 1 else None
+    args.removeTags = None
     return
 
+def buildEditions(editions):
+    print("Building caches for {} editions...".format(len(editions)))
+    planEditionsQuery(editions)
+    allRecipes = loadAllRecipesWithData().get("items")
+    imageSizesList = []
+    for recipeSlug, fullRecipeData, imageSizes in streamInOrder(prepareRecipePage, allRecipes.items()):
+        imageSizesList.append(imageSizes)
+    reportImageSavings(imageSizesList)
+
+    for edition in editions:
+        buildEdition(edition, allRecipes)
+    return
+
+def buildEdition(edition, allRecipes):
+    global globalRecipeCache
+
+    print("Edition: {} -> {}".format(edition["name"], edition["output"]))
+    renderedBefore = runMetrics["counters"].get("pagesRendered", 0)
+    applyEdition(edition)
+    globalRecipeCache = {"items": {recipeSlug: recipe for recipeSlug, recipe in allRecipes.items() if recipeMatchesFilters(recipe)}}
+    buildBookManifests()
+    generateFrontPages()
+    for recipeSlug, (categorySlug, recipeNumber) in globalRecipeLocations.items():
+        print("  Recipe: " + recipeSlug)
+        getRecipeAndConvertToPDF(recipeSlug, categorySlug, recipeNumber)
+    buildBookIndex()
+    generateIndexPDF()
+    with timedStage("waitForRenders"):
+        waitForPdfConversions()
+
+    assembleBook(edition["output"])
+    renderedCount = runMetrics["counters"].get("pagesRendered", 0) - renderedBefore
+    print("Edition {} done, {} pages rendered".format(edition["name"], renderedCount))
+    return renderedCount
+
+
+# BUILD SERVER ===========================================================================
+# --serve keeps one process running and builds books on request over HTTP:
+#
+#   POST /jobs              queue a build; the JSON body takes the edition options
+#                           (title, sub_title, dedication, tag, categories, removeTags,
+#                           indexIgnoreTags, foods, static_pages)
+#   GET  /jobs              every job's status
+#   GET  /jobs/{id}         one job's status
+#   GET  /jobs/{id}/pdf     the finished book
+#
+# A build runs on the module's global state, so jobs run one at a time on a builder
+# thread and at most --maxQueuedJobs wait behind it. Each job's pages are rendered on
+# the --jobs worker processes, which stay up between jobs with their stylesheets and
+# fonts loaded. The Jinja templates, the recipe store, prepared recipes and the pages
+# of the last book also stay in memory, so a job only fetches recipes that changed in
+# Mealie and only renders pages the last book didn't have.
+SERVER_JOBS_DIR = "server_jobs"
+SERVER_KEPT_JOBS = 50
+
+buildJobs = {}
+buildJobsLock = threading.Lock()
+
+def editionFromSpec(jobId, spec, defaultEdition):
+    if not isinstance(spec, dict):
+        raise ValueError("The build spec must be a JSON object")
+    settings = {}
+    for option, value in spec.items():
+        if option in EDITION_TEXT_OPTIONS:
+            if value is not None and not isinstance(value, str):
+                raise ValueError("{} must be a string".format(option))
+        elif option in EDITION_LIST_OPTIONS:
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                raise ValueError("{} must be a list of strings".format(option))
+        elif option == "static_pages":
+            if not isinstance(value, bool):
+                raise ValueError("static_pages must be true or false")
+        else:
+            raise ValueError("Unknown option {}".format(option))
+        settings[option] = value
+    settings["output"] = os.path.join(SERVER_JOBS_DIR, jobId + ".pdf")
+    edition = newEdition(jobId, settings, defaultEdition)
+    if not edition["categories"]:
+        raise ValueError("categories is required")
+    return edition
+
+def getJobStatus(job):
+    return {key: value for key, value in job.items() if key != "edition"}
+
+def updateJob(job, **changes):
+    with buildJobsLock:
+        job.update(changes)
+    return
+
+def pruneBuildJobs():
+    with buildJobsLock:
+        finishedJobs = [job for job in buildJobs.values() if job["status"] in ("done", "failed")]
+        for job in sorted(finishedJobs, key=lambda job: job["finishedAt"])[:-SERVER_KEPT_JOBS]:
+            del buildJobs[job["id"]]
+            if os.path.exists(job["edition"]["output"]):
+                os.remove(job["edition"]["output"])
+    return
+
+def loadJobRecipes(store, preparedRecipes):
+    # The listing planned for the job, with only the recipes that aren't up to date
+    # in the store fetched, and only new or changed recipes prepared again
+    if args.offline:
+        jobRecipes = {recipeSlug: recipe for recipeSlug, recipe in store["items"].items() if recipeMatchesListingQuery(recipe)}
+    else:
+        summaries, listedStamps = listRecipeSummaries()
+        evictDeletedRecipes(store, listedStamps)
+        storeIsStale = any(not recipeIsFreshInStore(store, recipeSlug, listedStamps[recipeSlug]) for recipeSlug in summaries)
+        jobRecipes = dict(streamFullRecipes(list(summaries), store, listedStamps))
+        if storeIsStale:
+            saveRecipeStore(store)
+    unprepared = [(recipeSlug, recipe) for recipeSlug, recipe in jobRecipes.items() if preparedRecipes.get(recipeSlug) is not recipe]
+    for recipeSlug, fullRecipeData, imageSizes in streamInOrder(prepareRecipePage, unprepared):
+        preparedRecipes[recipeSlug] = fullRecipeData
+    return jobRecipes
+
+def runBuildJobs(jobQueue, store):
+    preparedRecipes = {}
+    while True:
+        job = jobQueue.get()
+        updateJob(job, status="running", startedAt=time.time())
+        startTime = time.perf_counter()
+        try:
+            planEditionsQuery([job["edition"]])
+            jobRecipes = loadJobRecipes(store, preparedRecipes)
+            renderedCount = buildEdition(job["edition"], jobRecipes)
+            dropPagesOutsideBook()
+            updateJob(job, status="done", renderedPages=renderedCount, bookBytes=os.path.getsize(job["edition"]["output"]))
+        except (Exception, SystemExit) as error:
+            # One bad job mustn't take the server down with it. Pages it never got back
+            # were never marked as rendered, so the next job renders them again.
+            pendingPdfConversions.clear()
+            updateJob(job, status="failed", error="{}: {}".format(type(error).__name__, error))
+        updateJob(job, finishedAt=time.time(), seconds=round(time.perf_counter() - startTime, 3))
+        print("Job {} {} in {:.1f}s".format(job["id"], job["status"], job["seconds"]))
+        pruneBuildJobs()
+        pruneRenderedPdfs(args.cacheSizeMB * 1024 * 1024)
+        if not args.no_cache:
+            pruneRenderCache(args.cacheSizeMB * 1024 * 1024)
+
+
+class BuildServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, jobQueue, defaultEdition):
+        super().__init__(address, BuildRequestHandler)
+        self.jobQueue = jobQueue
+        self.defaultEdition = defaultEdition
+
+
+class BuildRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        return
+
+    def do_GET(self):
+        pathParts = self.path.strip("/").split("/")
+        with buildJobsLock:
+            if pathParts == ["jobs"]:
+                self.sendJson(200, [getJobStatus(job) for job in buildJobs.values()])
+                return
+            job = buildJobs.get(pathParts[1]) if len(pathParts) in (2, 3) and pathParts[0] == "jobs" else None
+            jobStatus = getJobStatus(job) if job else None
+            bookContent = None
+            if jobStatus is not None and jobStatus["status"] == "done" and pathParts[2:] == ["pdf"]:
+                # Read under the lock, or pruneBuildJobs could remove the book first
+                with open(job["edition"]["output"], "rb") as f:
+                    bookContent = f.read()
+        if jobStatus is None or (len(pathParts) == 3 and pathParts[2] != "pdf"):
+            self.sendJson(404, {"error": "Not found"})
+        elif len(pathParts) == 2:
+            self.sendJson(200, jobStatus)
+        elif jobStatus["status"] != "done":
+            self.sendJson(409, {"error": "Job is {}".format(jobStatus["status"])})
+        else:
+            self.sendBody(200, bookContent, "application/pdf")
+        return
+
+    def do_POST(self):
+        if self.path.strip("/") != "jobs":
+            self.sendJson(404, {"error": "Not found"})
+            return
+        jobId = uuid.uuid4().hex[:12]
+        try:
+            spec = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            edition = editionFromSpec(jobId, spec, self.server.defaultEdition)
+        except ValueError as error:
+            self.sendJson(400, {"error": str(error)})
+            return
+        job = {"id": jobId, "status": "queued", "queuedAt": time.time(), "edition": edition}
+        try:
+            self.server.jobQueue.put_nowait(job)
+        except queue.Full:
+            self.sendJson(503, {"error": "Too many queued jobs, try again later"})
+            return
+        with buildJobsLock:
+            buildJobs[jobId] = job
+            self.sendJson(202, getJobStatus(job))
+        return
+
+    def sendJson(self, status, body):
+        self.sendBody(status, json.dumps(body).encode(), "application/json")
+        return
+
+    def sendBody(self, status, body, contentType):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+
+def serveBuilds(host, port):
+    os.makedirs(SERVER_JOBS_DIR, exist_ok=True)
+    store = loadStoreForOffline() if args.offline else loadRecipeStore()
+    jobQueue = queue.Queue(maxsize=args.maxQueuedJobs)
+    server = BuildServer((host, port), jobQueue, getDefaultEdition())
+    threading.Thread(target=runBuildJobs, args=(jobQueue, store), daemon=True).start()
+    print("Serving builds on http://{}:{}/jobs, press Ctrl+C to stop".format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped serving")
+    server.server_close()
+    return
+
+
 # CONFIG LOADING =========================================================================
+CONFIG_FILENAME = "config.ini"
 
 def get_config_value(section, option):
     if not global_config.has_option(section, option):
@@ -598,12 +2280,11 @@ def get_config_value(section, option):
 
     return global_config[section][option]
 
-# MAIN ===================================================================================
-if __name__ == "__main__":
-
-    # Config
+def loadConfig():
+    # Also called again by --watch whenever config.ini changes
+    global global_config, TITLE, SUBTITLE, DEDICATION, MIN_RECIPES, MAX_RECIPES, MEALIE_URL, API_TOKEN, authHeader
     global_config = configparser.ConfigParser()
-    global_config.read('config.ini')
+    global_config.read(CONFIG_FILENAME)
     TITLE = get_config_value('cookbook', 'title')
     SUBTITLE = get_config_value('cookbook', 'sub_title')
     DEDICATION = get_config_value('cookbook', 'dedication')
@@ -617,127 +2298,226 @@ if __name__ == "__main__":
         "Content-Type": "application/json",
         "Authorization": "Bearer {}".format(API_TOKEN)
     }
+    return
 
-    # Argument Parsing
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-t", "--tag")
-    parser.add_argument("-c", "--categories", nargs="+")
-    parser.add_argument("-i", "--indexIgnoreTags", nargs="+")
-    parser.add_argument("--removeTags", nargs="+")
-    parser.add_argument("-f", "--foods", nargs="+")
-    parser.add_argument("--foodFile", nargs='?', const=True, default=False, type=bool)
+# COMMAND LINE ===========================================================================
+# Each mode is a subcommand with only the options it uses. Command lines from before the
+# subcommands, like `-c breakfast --static_pages` or `--ingredientDump`, are still read
+# with the old flat flags and mapped onto the matching command.
+COMMANDS = ["build", "recipe", "static", "lint", "dump-ingredients", "precompile-templates"]
+
+# The lint options were renamed for the command; the flat flags keep the old names
+LINT_OPTIONS = [
+    ("--titles", "--find_title_issues", {"dest": "find_title_issues", "action": 'store_true'}),
+    ("--steps", "--find_step_issues", {"dest": "find_step_issues", "action": 'store_true'}),
+    ("--format", "--lintFormat", {"dest": "lintFormat", "choices": ["text", "json", "sarif"], "default": "text"}),
+    ("--output", "--lintOutput", {"dest": "lintOutput"}),
+]
+
+def buildOptionGroups():
+    # Every option is declared once, here. Each command takes the groups it uses and
+    # the flat flags take all of them, so the two can't drift apart.
+    groups = {groupName: argparse.ArgumentParser(add_help=False) for groupName in ("run", "source", "filter", "jobs", "render", "image", "book")}
+    groups["run"].add_argument("--profile", nargs='?', const="run_profile.pstats")
+    groups["run"].add_argument("--runReport", action='store_true')
+
+    groups["source"].add_argument("--fetchWorkers", type=int, default=8)
+    groups["source"].add_argument("--offline", action='store_true')
+    # --from-backup is the spelling it first shipped with
+    groups["source"].add_argument("--fromBackup", "--from-backup", dest="from_backup")
+
+    groups["filter"].add_argument("-t", "--tag")
+    groups["filter"].add_argument("-c", "--categories", nargs="+")
+    groups["filter"].add_argument("--removeTags", nargs="+")
+
+    groups["jobs"].add_argument("-j", "--jobs", type=int, default=1)
+
+    # --no-cache is the spelling from before the flags were camelCase
+    groups["render"].add_argument("--noCache", "--no-cache", dest="no_cache", action='store_true')
+    groups["render"].add_argument("--cacheSizeMB", type=int, default=500)
+    groups["render"].add_argument("--keepArtifacts", "--keep-artifacts", dest="keep_artifacts", action='store_true')
+
+    groups["image"].add_argument("--imageDpi", type=int, default=150)
+
+    groups["book"].add_argument("-i", "--indexIgnoreTags", nargs="+")
+    groups["book"].add_argument("-f", "--foods", nargs="+")
+    groups["book"].add_argument("--foodFile", nargs='?', const=True, default=False, type=bool)
+    groups["book"].add_argument("--static_pages", action='store_true')
+    groups["book"].add_argument("--singlePass", "--single-pass", dest="single_pass", action='store_true')
+    groups["book"].add_argument("--optimize", action='store_true')
+    groups["book"].add_argument("--linearize", action='store_true')
+    groups["book"].add_argument("--watch", action='store_true')
+    groups["book"].add_argument("--pollInterval", type=float, default=30)
+    groups["book"].add_argument("--editions")
+    groups["book"].add_argument("--serve", nargs='?', type=int, const=8080)
+    groups["book"].add_argument("--serveHost", default="127.0.0.1")
+    groups["book"].add_argument("--maxQueuedJobs", type=int, default=20)
+    return groups
+
+def buildLegacyParser():
+    parser = argparse.ArgumentParser(parents=list(buildOptionGroups().values()))
+    # The flags that picked the mode before there were commands
     parser.add_argument("-r", "--recipe")
     parser.add_argument("--ingredientDump", nargs='?', const=True, default=False, type=bool)
-    parser.add_argument("--static_pages", action='store_true')
     parser.add_argument("--just_static_pages", action='store_true')
-    parser.add_argument("--find_step_issues", action='store_true')
-    parser.add_argument("--find_title_issues",action='store_true')
-    args = parser.parse_args()
+    parser.add_argument("--precompileTemplates", "--precompile-templates", dest="precompile_templates", action='store_true')
+    for _, legacyFlag, options in LINT_OPTIONS:
+        parser.add_argument(legacyFlag, **options)
+    return parser
+
+def buildCommandParser():
+    groups = buildOptionGroups()
+    parser = argparse.ArgumentParser(epilog="Flags from before the commands, like -c breakfast --static_pages, still work on their own.")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    commands.add_parser("build", parents=[groups[groupName] for groupName in ("run", "source", "filter", "jobs", "render", "image", "book")], help="build the cookbook")
+
+    recipe = commands.add_parser("recipe", parents=[groups[groupName] for groupName in ("run", "source", "render", "image")], help="render one recipe page")
+    recipe.add_argument("recipe", metavar="slug")
+
+    commands.add_parser("static", parents=[groups[groupName] for groupName in ("run", "jobs", "render")], help="render the static reference pages")
+
+    lint = commands.add_parser("lint", parents=[groups[groupName] for groupName in ("run", "source", "filter", "jobs")], help="check recipes for title and step issues")
+    for commandFlag, _, options in LINT_OPTIONS:
+        lint.add_argument(commandFlag, **options)
+
+    commands.add_parser("dump-ingredients", parents=[groups[groupName] for groupName in ("run", "source", "filter")], help="write every ingredient to ingredientsForIndex.txt")
+    commands.add_parser("precompile-templates", parents=[groups["run"]], help="compile every template into the template cache")
+    return parser
+
+def getLegacyCommand(legacyArgs):
+    # The flags are checked in the order the old script checked them
+    if legacyArgs.precompile_templates:
+        return "precompile-templates"
+    if legacyArgs.recipe:
+        return "recipe"
+    if legacyArgs.ingredientDump:
+        return "dump-ingredients"
+    if legacyArgs.find_step_issues or legacyArgs.find_title_issues:
+        return "lint"
+    if legacyArgs.just_static_pages:
+        return "static"
+    return "build"
+
+def parseArguments(argv):
+    # Options a command doesn't take keep the old flags' defaults, so code shared
+    # between commands can read any of them
+    legacyParser = buildLegacyParser()
+    if not argv or argv[0] in COMMANDS or argv[0] in ("-h", "--help"):
+        parser = buildCommandParser()
+        args = legacyParser.parse_args([])
+        vars(args).update(vars(parser.parse_args(argv)))
+        if args.command == "lint" and not (args.find_step_issues or args.find_title_issues):
+            args.find_step_issues = args.find_title_issues = True
+    else:
+        parser = legacyParser
+        args = parser.parse_args(argv)
+        args.command = getLegacyCommand(args)
+
+    if args.command == "build" and not (args.categories or args.editions or args.serve is not None):
+        parser.error("nothing to build, give --categories, --editions or --serve")
+    if args.watch and (not args.categories or args.single_pass or args.editions):
+        parser.error("--watch needs --categories and can't be used with --singlePass or --editions")
+    if args.single_pass and (args.jobs > 1 or args.no_cache):
+        # One process lays out the whole book and the render cache is never read, so
+        # neither would do anything
+        parser.error("--singlePass can't be used with --jobs or --noCache")
+    if args.serve is not None and (args.watch or args.editions):
+        parser.error("--serve can't be used with --watch or --editions")
+    if args.from_backup and args.imageDpi == 0:
+        parser.error("--fromBackup can't be used with --imageDpi 0, which points pages at Mealie's image URLs")
+    if args.from_backup:
+        # The backup stands in for recipeCache.json, so every step that works offline works from it
+        args.offline = True
+    return args
+
+
+# MAIN ===================================================================================
+if __name__ == "__main__":
+
+    # Config
+    loadConfig()
+
+    # Argument Parsing
+    args = parseArguments(sys.argv[1:])
+
+    runMetrics = newRunMetrics()
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
 
     # Global data objects
     globalRecipeCache = {}
     globalCategoryCache = {}
     globalTagCache = {}
+    globalRecipeIndex = {}
     globalCategoryManifest = {}
+    globalRecipeLocations = {}
     globalIngredientManifest = {}
     globalTagManifest = {}
     globalIndexCatalog = {}
     globalStaticCatalog = {}
-    
-
-    # Templates
-    templateLoader = jinja2.FileSystemLoader(searchpath="./templates")
-    templateEnv = jinja2.Environment(loader=templateLoader)
-    recipeTemplate = templateEnv.get_template("recipe_page_template.html")
-    recipeTemplate.globals['convertDecimalToFractionString'] = convertDecimalToFractionString
-    recipeTemplate.globals['getIngredientNoteAppend'] = getIngredientNoteAppend
-    recipeTemplate.globals['pluralizeUnit'] = pluralizeUnit
-    recipeTemplate.globals['pluralizeIngredient'] = pluralizeIngredient
-    sectionTemplate = templateEnv.get_template("section_template.html")
-    sectionTemplate.globals['getRecipeName'] = getRecipeName
-    sectionTemplate.globals['getRecipeNumber'] = getRecipeNumber
-    titleTemplate = templateEnv.get_template("title_template.html")
-    tocTemplate = templateEnv.get_template("toc_template.html")
-    tocTemplate.globals['getRecipeName'] = getRecipeName
-    tocTemplate.globals['getCategoryName'] = getCategoryName
-    tocTemplate.globals['getRecipeNumber'] = getRecipeNumber
-    indexTemplate = templateEnv.get_template("index_template.html")
-    indexTemplate.globals['getRecipeName'] = getRecipeName
-    indexTemplate.globals['getRecipeNumber'] = getRecipeNumber
-    dedicationTemplate = templateEnv.get_template("dedication_template.html")
-    spiceUsesTemplate = templateEnv.get_template("spice_uses_template.html")
-    substitutionsTemplate = templateEnv.get_template("substitutions_template.html")
-    unitConversionTemplate = templateEnv.get_template("unit_conversions_template.html")
-    sousVideTemplate = templateEnv.get_template("sous_vide_template.html")
-
-
-    prepareOutputDir()
-
-    if args.recipe:
+    globalRecipeImages = {}
+    globalIngredientLines = {}
+
+    # Rendering, set up only for the commands that render or lint across processes
+    renderPool = startRenderPool(args.jobs) if args.command in ("build", "static", "lint") else None
+    pendingPdfConversions = []
+    renderedPages = {}
+    renderedPageKeys = {}
+    renderedPdfs = {}
+    singlePassPages = {}
+
+    if args.command in ("build", "static", "recipe"):
+        prepareOutputDir()
+
+    lintFindings = []
+    if args.command == "precompile-templates":
+        precompileTemplates()
+    elif args.command == "recipe":
         generateSingleRecipePage(args.recipe)
-    elif args.ingredientDump:
+    elif args.command == "dump-ingredients":
         print("Building caches...")
-        globalRecipeCache = fetchAllRecipesWithData()
+        globalRecipeCache = loadAllRecipesWithData()
         dumpIngredientList()
-    elif args.find_step_issues:
+    elif args.command == "lint":
         print("Building caches...")
-        globalRecipeCache = fetchAllRecipesWithData()
-        findAndPrintOvenTempsInSteps()
-        findAndPrintMeasurementsInSteps()
-        findAndPrintLinesNotEndingWithPeriod()
-        findAndPrintFractionsInSteps()
-    elif args.find_title_issues:
-        print("Building caches...")
-        globalRecipeCache = fetchAllRecipesWithData()
-        findAndPrintPosessiveTitles()
-    elif args.just_static_pages:
+        globalRecipeCache = loadAllRecipesWithData()
+        lintScopes = tuple(scope for scope, wanted in (("step", args.find_step_issues), ("title", args.find_title_issues)) if wanted)
+        lintFindings = lintRecipes(lintScopes)
+        writeLintReport(lintFindings, lintScopes)
+    elif args.command == "static":
         print("generating static pages")
         generateSpiceUsesPDF(intToRoman(1))
         generateSubstitutionsPDF(intToRoman(2))
         generateUnitConversionsPDF(intToRoman(3))
         generateSousVidePDF(intToRoman(4))
-    elif args.categories:
-
-        print("Building caches...")
-        globalRecipeCache = fetchAllRecipesWithData()
-        dumpGlobalRecipeData()
-        globalCategoryCache = generateCategoryCache()
-        globalTagCache = generateTagCache()
-
-        globalCategoryManifest = buildCategoryManifest(args.categories)
-        globalTagManifest = buildTagManifest()
-
-        globalStaticCatalog = buildStaticPagesCatalog()
-
-        generateTitlePDF()
-
-        if args.static_pages:
-            generateSpiceUsesPDF(globalStaticCatalog['Herb Uses'])
-            generateSubstitutionsPDF(globalStaticCatalog['Substitutions'])
-            generateUnitConversionsPDF(globalStaticCatalog['Unit Conversions'])
-            generateSousVidePDF(globalStaticCatalog['Sous Vide Times'])
-
-        if DEDICATION != None and DEDICATION != "":
-            generateDedicationPDF(DEDICATION)
-
-        generateToCPDF()
-        for categorySlug in globalCategoryManifest:
-            print("Category: " + categorySlug)
-            generateSectionHeaderPDF(categorySlug)
-            for recipe in globalCategoryManifest[categorySlug]:
-                print("  Recipe: " + recipe)
-                getRecipeAndConvertToPDF(recipe, categorySlug, getRecipeNumber(recipe))
-        
-        if args.foods:
-            globalIngredientManifest = buildIngredientManifest(args.foods)
-        elif args.foodFile:
-            globalIngredientManifest = buildIngredientManifest(readFoodsFromFile("ingredientsForIndex.txt"))
-        else:
-            globalIngredientManifest = buildIngredientManifest([])
-
-        print("Building Index")
-        globalIndexCatalog = buildIndexCatalog()
-        generateIndexPDF()
-        
-        combinePDFs()
+        waitForPdfConversions()
+        saveRenderedPages()
+    elif args.serve is not None:
+        serveBuilds(args.serveHost, args.serve)
+    elif args.editions:
+        buildEditions(readEditions(args.editions))
+    else:
+        store = buildCookbook()
+        if args.watch:
+            watchCookbook(store)
+
+    if args.command in ("build", "static") and not args.no_cache:
+        pruneRenderCache(args.cacheSizeMB * 1024 * 1024)
+
+    if renderPool is not None:
+        renderPool.shutdown()
+
+    if profiler is not None:
+        profiler.disable()
+        writeProfile(profiler, args.profile)
+    # The other commands don't render anything, so they only write one when asked
+    if args.command in ("build", "recipe", "static") or args.runReport:
+        writeRunReport()
+
+    # Lets the polishing checks gate a build script
+    if lintFindings:
+        sys.exit(1)
     
\ No newline at end of file